@@ -0,0 +1,450 @@
+import math
+import pickle
+import random
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict, namedtuple
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.utils.module_loading import import_string
+
+# Значение, записанное после пересчёта: время истечения и сколько
+# секунд занял пересчёт — по ним решается, пора ли пересчитать заранее.
+Entry = namedtuple('Entry', 'value expires delta')
+
+STAT_COUNTERS = ('local_hits', 'shared_hits', 'misses', 'waits',
+                 'recomputes')
+STATS_KEY = 'cache_stats:{}:{}'
+STATS_PREFIXES_KEY = 'cache_stats:prefixes'
+
+_missing = object()
+
+
+def key_prefix(key):
+    """Группа ключа для метрик: feed_generation, template.cache.index_page."""
+    prefix = key.split(':', 1)[0]
+    if prefix.startswith('template.cache.'):
+        prefix = prefix.rsplit('.', 1)[0]
+    return prefix
+
+
+class SQLiteCache(BaseCache):
+    """
+    Общий для всех процессов кэш в файле SQLite. Подходит как второй
+    уровень TieredCache там, где нет Redis или memcached.
+    """
+
+    CULL_EVERY = 100
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+        self._writes = 0
+
+    @property
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self._path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)')
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)')
+            self._local.connection = connection
+        return connection
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _alive(self, expires):
+        return expires is None or expires > time.time()
+
+    def get(self, key, default=None, version=None):
+        row = self._connection.execute(
+            'SELECT value, expires FROM cache WHERE key = ?',
+            (self._key(key, version),)).fetchone()
+        if row is None or not self._alive(row[1]):
+            return default
+        return pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        found = {}
+        names = list(keys)
+        for start in range(0, len(names), 500):
+            chunk = names[start:start + 500]
+            rows = self._connection.execute(
+                'SELECT key, value, expires FROM cache WHERE key IN (%s)'
+                % ', '.join('?' * len(chunk)), chunk)
+            for name, value, expires in rows:
+                if self._alive(expires):
+                    found[keys[name]] = pickle.loads(value)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._connection.execute(
+            'INSERT OR REPLACE INTO cache VALUES (?, ?, ?)',
+            (self._key(key, version), pickle.dumps(value, -1),
+             self.get_backend_timeout(timeout)))
+        self._wrote()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        # Занятый ключ перезаписывается, только если он уже истёк.
+        cursor = self._connection.execute(
+            'INSERT INTO cache VALUES (?, ?, ?) ON CONFLICT (key) DO UPDATE '
+            'SET value = excluded.value, expires = excluded.expires '
+            'WHERE cache.expires <= ?',
+            (self._key(key, version), pickle.dumps(value, -1),
+             self.get_backend_timeout(timeout), time.time()))
+        self._wrote()
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        name = self._key(key, version)
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT value, expires FROM cache WHERE key = ?',
+                (name,)).fetchone()
+            if row is None or not self._alive(row[1]):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (pickle.dumps(value, -1), name))
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self._connection.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), self._key(key, version),
+             time.time()))
+        return cursor.rowcount == 1
+
+    def delete(self, key, version=None):
+        self._connection.execute(
+            'DELETE FROM cache WHERE key = ?', (self._key(key, version),))
+
+    def has_key(self, key, version=None):
+        return self.get(key, _missing, version=version) is not _missing
+
+    def clear(self):
+        self._connection.execute('DELETE FROM cache')
+
+    def _wrote(self):
+        self._writes += 1
+        if self._writes % self.CULL_EVERY == 0:
+            self._cull()
+
+    def _cull(self):
+        connection = self._connection
+        connection.execute(
+            'DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self._cull_frequency,))
+
+
+class LocalStore:
+    """Ограниченный по размеру LRU-кэш процесса."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value, expires = self.entries.get(key, (_missing, 0))
+            if value is _missing:
+                return _missing
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return _missing
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_stores = {}
+_stats = defaultdict(lambda: defaultdict(Counter))
+_stats_lock = threading.Lock()
+_stats_flushed = defaultdict(time.monotonic)
+
+
+class TieredCache(BaseCache):
+    """
+    Двухуровневый кэш: LRU в памяти процесса поверх общего хранилища
+    (OPTIONS['SHARED'] — описание бэкенда в формате CACHES).
+
+    Локальная копия живёт не дольше LOCAL_TIMEOUT секунд, поэтому
+    изменения из других процессов видны с такой задержкой. Ключи из
+    SHARED_ONLY_PREFIXES — поколения лент и отметки реплик, которые
+    меняются через incr() и add() и должны сразу видеть все процессы, —
+    в памяти процесса не хранятся. Промах по
+    ключу из HOT_PREFIXES пересчитывает один процесс, остальные до
+    WAIT_TIMEOUT секунд ждут его результат. Значения, записанные после
+    промаха, пересчитываются заранее с вероятностью, растущей к концу
+    их срока (XFetch), пока остальные читают старое значение.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        shared = options['SHARED']
+        self.shared = import_string(shared['BACKEND'])(
+            shared.get('LOCATION', ''), shared)
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self.hot_prefixes = tuple(options.get(
+            'HOT_PREFIXES', ('template.cache.',)))
+        self.shared_only_prefixes = tuple(options.get(
+            'SHARED_ONLY_PREFIXES',
+            ('feed_generation:', 'feed_bumped:', 'replica_synced:')))
+        self.lock_timeout = options.get('LOCK_TIMEOUT', 10)
+        self.wait_timeout = options.get('WAIT_TIMEOUT', 2)
+        self.beta = options.get('EARLY_RECOMPUTE_BETA', 1.0)
+        self.stats_interval = options.get('STATS_INTERVAL', 60)
+        self.location = location
+        self.local = _stores.setdefault(
+            location, LocalStore(options.get('LOCAL_MAX_ENTRIES', 1000)))
+        self._pending = threading.local()
+
+    def _key(self, key, version):
+        name = self.make_key(key, version=version)
+        self.validate_key(name)
+        return name
+
+    def _timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def _started(self):
+        if not hasattr(self._pending, 'started'):
+            self._pending.started = {}
+            self._pending.locks = set()
+        return self._pending.started
+
+    def _record(self, key, counter):
+        with _stats_lock:
+            stats = _stats[self.location]
+            stats[key_prefix(key)][counter] += 1
+            flushed = _stats_flushed[self.location]
+            if time.monotonic() - flushed < self.stats_interval:
+                return
+            stats = _stats.pop(self.location)
+            _stats_flushed[self.location] = time.monotonic()
+        self.flush_stats(stats)
+
+    def flush_stats(self, stats=None):
+        """Переносит счётчики процесса в общее хранилище."""
+        if stats is None:
+            with _stats_lock:
+                stats = _stats.pop(self.location, {})
+        if not stats:
+            return
+        prefixes = set(self.shared.get(STATS_PREFIXES_KEY, ()))
+        if not prefixes.issuperset(stats):
+            self.shared.set(STATS_PREFIXES_KEY, prefixes | set(stats), None)
+        for prefix, counters in stats.items():
+            for counter, value in counters.items():
+                key = STATS_KEY.format(prefix, counter)
+                self.shared.add(key, 0, None)
+                self.shared.incr(key, value)
+
+    def stats(self):
+        """Счётчики по группам ключей из общего хранилища и доля попаданий."""
+        self.flush_stats()
+        result = {}
+        for prefix in sorted(self.shared.get(STATS_PREFIXES_KEY, ())):
+            counters = {
+                counter: self.shared.get(STATS_KEY.format(prefix, counter), 0)
+                for counter in STAT_COUNTERS
+            }
+            hits = counters['local_hits'] + counters['shared_hits']
+            total = hits + counters['misses']
+            counters['hit_ratio'] = hits / total if total else 0.0
+            result[prefix] = counters
+        return result
+
+    def _remember(self, key, name, value):
+        if key.startswith(self.shared_only_prefixes):
+            return
+        timeout = self.local_timeout
+        if isinstance(value, Entry) and value.expires is not None:
+            timeout = min(timeout, value.expires - time.time())
+        if timeout > 0:
+            self.local.set(name, value, timeout)
+
+    def _acquire(self, key, version):
+        if self.shared.add(f'{key}:lock', 1, self.lock_timeout,
+                           version=version):
+            self._started()
+            self._pending.locks.add((key, version))
+            return True
+        return False
+
+    def _release(self, key, version):
+        self._started()
+        if (key, version) in self._pending.locks:
+            self._pending.locks.discard((key, version))
+            self.shared.delete(f'{key}:lock', version=version)
+
+    def _expiring(self, entry):
+        if entry.expires is None or not entry.delta:
+            return False
+        jitter = -entry.delta * self.beta * math.log(1 - random.random())
+        return time.time() + jitter >= entry.expires
+
+    def _miss(self, name):
+        started = self._started()
+        if len(started) > 1000:
+            started.clear()
+        started[name] = time.monotonic()
+
+    def _wait(self, key, version):
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            value = self.shared.get(key, _missing, version=version)
+            if value is not _missing:
+                return value
+        return _missing
+
+    def get(self, key, default=None, version=None):
+        name = self._key(key, version)
+        value = self.local.get(name)
+        if value is not _missing:
+            self._record(key, 'local_hits')
+        else:
+            value = self.shared.get(key, _missing, version=version)
+            if value is not _missing:
+                self._record(key, 'shared_hits')
+                self._remember(key, name, value)
+        if value is _missing:
+            self._record(key, 'misses')
+            if key.startswith(self.hot_prefixes) and not self._acquire(
+                    key, version):
+                self._record(key, 'waits')
+                value = self._wait(key, version)
+            if value is _missing:
+                self._miss(name)
+                return default
+        if isinstance(value, Entry):
+            if self._expiring(value) and self._acquire(key, version):
+                self._record(key, 'recomputes')
+                self._miss(name)
+                return default
+            value = value.value
+        return value
+
+    def get_many(self, keys, version=None):
+        found, shared_keys = {}, []
+        for key in keys:
+            value = self.local.get(self._key(key, version))
+            if value is _missing:
+                shared_keys.append(key)
+            else:
+                self._record(key, 'local_hits')
+                found[key] = value
+        if shared_keys:
+            for key, value in self.shared.get_many(
+                    shared_keys, version=version).items():
+                self._record(key, 'shared_hits')
+                self._remember(key, self._key(key, version), value)
+                found[key] = value
+        for key in shared_keys:
+            if key not in found:
+                self._record(key, 'misses')
+        return {key: value.value if isinstance(value, Entry) else value
+                for key, value in found.items()}
+
+    def _wrap(self, name, value, timeout):
+        started = self._started().pop(name, None)
+        if started is None:
+            return value
+        expires = None if timeout is None else time.time() + timeout
+        return Entry(value, expires, time.monotonic() - started)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        name = self._key(key, version)
+        timeout = self._timeout(timeout)
+        value = self._wrap(name, value, timeout)
+        self.shared.set(key, value, timeout, version=version)
+        self._remember(key, name, value)
+        self._release(key, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        for key, value in data.items():
+            self.set(key, value, timeout, version=version)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        # add() служит для начальных значений и счётчиков, которые потом
+        # меняет incr(), поэтому значение не оборачивается в Entry.
+        name = self._key(key, version)
+        timeout = self._timeout(timeout)
+        self._started().pop(name, None)
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._remember(key, name, value)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        self._remember(key, self._key(key, version), value)
+        return value
+
+    def decr(self, key, delta=1, version=None):
+        return self.incr(key, -delta, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self.local.delete(self._key(key, version))
+        return self.shared.touch(key, self._timeout(timeout), version=version)
+
+    def delete(self, key, version=None):
+        self.local.delete(self._key(key, version))
+        self.shared.delete(key, version=version)
+        self._release(key, version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        if self.local.get(self._key(key, version)) is not _missing:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
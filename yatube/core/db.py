@@ -0,0 +1,36 @@
+import threading
+import time
+
+from django.conf import settings
+
+_maintained = {}
+_lock = threading.Lock()
+
+
+def pragma_statements(pragmas):
+    return [f'PRAGMA {name} = {value}' for name, value in pragmas.items()]
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    Выполняет PRAGMA из DATABASES[alias]['PRAGMAS'] на каждом новом
+    соединении SQLite и не чаще SQLITE_MAINTENANCE_INTERVAL секунд
+    обновляет статистику планировщика и переносит WAL в основной файл.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    raw = connection.connection
+    for statement in pragma_statements(
+            connection.settings_dict.get('PRAGMAS', {})):
+        raw.execute(statement)
+    with _lock:
+        now = time.monotonic()
+        last = _maintained.get(connection.alias)
+        if last is not None and (
+                now - last < settings.SQLITE_MAINTENANCE_INTERVAL):
+            return
+        _maintained[connection.alias] = now
+    # Первое соединение процесса только запускает отсчёт.
+    if last is not None:
+        raw.execute('PRAGMA optimize')
+        raw.execute('PRAGMA wal_checkpoint(PASSIVE)')
@@ -0,0 +1,127 @@
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.db import pragma_statements
+from posts.management.commands.benchmark_views import percentile
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, author_id INTEGER NOT NULL, '
+    'text TEXT NOT NULL, pub_date REAL NOT NULL)',
+    'CREATE INDEX post_author_pub_date ON post (author_id, pub_date)',
+    'CREATE INDEX post_pub_date ON post (pub_date)',
+)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность SQLite со смешанной '
+            'нагрузкой чтения и записи без PRAGMA и с SQLITE_PRAGMAS.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--rows', type=int, default=50000)
+        parser.add_argument('--authors', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.options = options
+        directory = tempfile.mkdtemp()
+        try:
+            template = os.path.join(directory, 'template.sqlite3')
+            self.populate(template)
+            for name, pragmas in (('по умолчанию', {}),
+                                  ('SQLITE_PRAGMAS', settings.SQLITE_PRAGMAS)):
+                path = os.path.join(directory, 'bench.sqlite3')
+                shutil.copy(template, path)
+                self.report(name, self.run(path, pragmas))
+                for suffix in ('', '-wal', '-shm'):
+                    if os.path.exists(path + suffix):
+                        os.remove(path + suffix)
+        finally:
+            shutil.rmtree(directory)
+
+    def populate(self, path):
+        connection = sqlite3.connect(path)
+        for statement in SCHEMA:
+            connection.execute(statement)
+        now = time.time()
+        connection.executemany(
+            'INSERT INTO post (author_id, text, pub_date) VALUES (?, ?, ?)',
+            ((i % self.options['authors'], f'post {i}', now - i)
+             for i in range(self.options['rows'])))
+        connection.commit()
+        connection.close()
+
+    def connect(self, path, pragmas):
+        # Без PRAGMA — как Django по умолчанию: ожидание блокировки 5 с.
+        connection = sqlite3.connect(path, timeout=5, isolation_level=None)
+        for statement in pragma_statements(pragmas):
+            connection.execute(statement)
+        return connection
+
+    def run(self, path, pragmas):
+        deadline = time.monotonic() + self.options['seconds']
+        results = {'read': [], 'write': [], 'errors': 0}
+        lock = threading.Lock()
+
+        def worker(kind):
+            connection = self.connect(path, pragmas)
+            rng = random.Random()
+            latencies, errors = [], 0
+            while time.monotonic() < deadline:
+                author = rng.randrange(self.options['authors'])
+                started = time.perf_counter()
+                try:
+                    if kind == 'read':
+                        connection.execute(
+                            'SELECT id, text FROM post WHERE author_id = ? '
+                            'ORDER BY pub_date DESC LIMIT 10',
+                            (author,)).fetchall()
+                        connection.execute(
+                            'SELECT id, text FROM post '
+                            'ORDER BY pub_date DESC LIMIT 10').fetchall()
+                    else:
+                        connection.execute('BEGIN IMMEDIATE')
+                        connection.execute(
+                            'INSERT INTO post (author_id, text, pub_date) '
+                            'VALUES (?, ?, ?)', (author, 'new', time.time()))
+                        connection.execute('COMMIT')
+                except sqlite3.OperationalError:
+                    errors += 1
+                    if connection.in_transaction:
+                        connection.execute('ROLLBACK')
+                    continue
+                latencies.append(time.perf_counter() - started)
+            connection.close()
+            with lock:
+                results[kind].extend(latencies)
+                results['errors'] += errors
+
+        threads = [threading.Thread(target=worker, args=('read',))
+                   for _ in range(self.options['readers'])]
+        threads += [threading.Thread(target=worker, args=('write',))
+                    for _ in range(self.options['writers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def report(self, name, results):
+        seconds = self.options['seconds']
+        lines = [f'{name}:']
+        for kind, title in (('read', 'чтения'), ('write', 'записи')):
+            latencies = results[kind] or [0]
+            lines.append(
+                f'  {title}: {len(results[kind]) / seconds:.0f}/с, '
+                f'p95 {percentile(latencies, 0.95) * 1000:.1f} мс')
+        lines.append(f'  ошибок блокировки: {results["errors"]}')
+        self.stdout.write('\n'.join(lines))
@@ -0,0 +1,25 @@
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ('Выводит попадания, промахи и пересчёты кэша по группам '
+            'ключей, собранные всеми процессами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alias', default='default')
+
+    def handle(self, *args, **options):
+        cache = caches[options['alias']]
+        if not hasattr(cache, 'stats'):
+            raise CommandError(
+                f'Кэш {options["alias"]} не собирает метрики.')
+        self.stdout.write(
+            f'{"группа":<40} {"локально":>9} {"общий":>9} {"промахи":>9} '
+            f'{"ожидания":>9} {"пересчёты":>9} {"попадания":>9}')
+        for prefix, counters in cache.stats().items():
+            self.stdout.write(
+                f'{prefix:<40} {counters["local_hits"]:>9} '
+                f'{counters["shared_hits"]:>9} {counters["misses"]:>9} '
+                f'{counters["waits"]:>9} {counters["recomputes"]:>9} '
+                f'{counters["hit_ratio"]:>9.1%}')
@@ -0,0 +1,34 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.routers import mark_synced
+
+
+class Command(BaseCommand):
+    help = ('Копирует базу default в реплики SQLite из DATABASE_REPLICAS '
+            'онлайн-резервированием, не останавливая запись, и отмечает '
+            'время копии: по нему ReplicaMiddleware оценивает отставание. '
+            'Запускается чаще, чем раз в REPLICA_LAG_TOLERANCE секунд.')
+
+    def handle(self, *args, **options):
+        source = connections['default']
+        if source.vendor != 'sqlite':
+            raise CommandError('Команда копирует только базы SQLite.')
+        for alias in settings.DATABASE_REPLICAS:
+            replica = connections[alias]
+            if replica.vendor != 'sqlite':
+                raise CommandError(f'{alias}: реплика не SQLite.')
+            # Открытое соединение держало бы старый снимок файла.
+            replica.close()
+            # Копия содержит всё, что записано до начала резервирования.
+            started = time.time()
+            with sqlite3.connect(source.settings_dict['NAME']) as src, \
+                    sqlite3.connect(replica.settings_dict['NAME']) as dst:
+                src.backup(dst)
+            mark_synced(alias, started)
+            self.stdout.write(f'{alias}: скопировано за '
+                              f'{time.time() - started:.1f} с')
@@ -0,0 +1,254 @@
+import json
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.template.backends.django import Template
+
+from .routers import (choose_replica, fell_back, replica_lags, route_reads,
+                      wrote)
+
+logger = logging.getLogger('yatube.requests')
+
+_local = threading.local()
+
+
+class QueryBudgetExceeded(Exception):
+    """View выполнил больше SQL-запросов, чем заявлено в бюджете."""
+
+
+class RequestMetrics:
+    """Счётчики одного запроса."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.paused = 0
+
+    def record_query(self, execute, sql, params, many, context):
+        if self.paused:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+
+def current_metrics():
+    """Метрики текущего запроса или None вне запроса."""
+    return getattr(_local, 'metrics', None)
+
+
+@contextmanager
+def unmetered():
+    """
+    Не учитывает SQL-запросы и обращения к кэшу внутри блока в метриках
+    и бюджете текущего запроса. Для работы, которую в проде выполняет
+    фон, а при отладке — сам запрос.
+    """
+    metrics = current_metrics()
+    if metrics is None:
+        yield
+        return
+    metrics.paused += 1
+    try:
+        yield
+    finally:
+        metrics.paused -= 1
+
+
+def _timed_render(render):
+    def wrapper(self, *args, **kwargs):
+        metrics = current_metrics()
+        if metrics is None:
+            return render(self, *args, **kwargs)
+        # Вложенные render_to_string не должны учитываться дважды.
+        metrics.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            metrics.template_depth -= 1
+            if not metrics.template_depth:
+                metrics.template_time += time.perf_counter() - started
+    wrapper.timed = True
+    return wrapper
+
+
+if not getattr(Template.render, 'timed', False):
+    Template.render = _timed_render(Template.render)
+
+
+def _count_cache(backend, metrics):
+    """Оборачивает get/get_many кэша текущего потока на время запроса."""
+    get, get_many = backend.get, backend.get_many
+    missing = object()
+
+    def counted_get(key, default=None, version=None):
+        if metrics.paused:
+            return get(key, default, version=version)
+        value = get(key, missing, version=version)
+        if value is missing:
+            metrics.cache_misses += 1
+            return default
+        metrics.cache_hits += 1
+        return value
+
+    def counted_get_many(keys, version=None):
+        keys = list(keys)
+        found = get_many(keys, version=version)
+        if metrics.paused:
+            return found
+        metrics.cache_hits += len(found)
+        metrics.cache_misses += len(keys) - len(found)
+        return found
+
+    backend.get, backend.get_many = counted_get, counted_get_many
+
+    def restore():
+        del backend.get, backend.get_many
+    return restore
+
+
+def query_budget(limit):
+    """Объявляет допустимое число SQL-запросов для view."""
+    def decorator(view_func):
+        view_func.query_budget = limit
+        return view_func
+    return decorator
+
+
+class RequestMetricsMiddleware:
+    """
+    Считает SQL-запросы, время БД, попадания в кэш и время рендеринга,
+    отдаёт их в заголовке Server-Timing и пишет строкой в лог.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        _local.metrics = metrics
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(metrics.record_query))
+                for alias in settings.CACHES:
+                    stack.callback(_count_cache(caches[alias], metrics))
+                response = self.get_response(request)
+        finally:
+            _local.metrics = None
+        total = time.perf_counter() - started
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={metrics.db_time * 1000:.1f};'
+            f'desc="{metrics.queries} queries"',
+            f'cache;desc="{metrics.cache_hits} hits '
+            f'{metrics.cache_misses} misses"',
+            f'tpl;dur={metrics.template_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ))
+        budget = getattr(request, 'query_budget', None)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': getattr(request, 'view_name', None),
+            'status': response.status_code,
+            'queries': metrics.queries,
+            'query_budget': budget,
+            'db_ms': round(metrics.db_time * 1000, 1),
+            'cache_hits': metrics.cache_hits,
+            'cache_misses': metrics.cache_misses,
+            'template_ms': round(metrics.template_time * 1000, 1),
+            'db_route': getattr(request, 'db_route', None),
+            'replica_lag_s': getattr(request, 'replica_lag', None),
+            'total_ms': round(total * 1000, 1),
+        }))
+        if budget is not None and metrics.queries > budget:
+            self.budget_exceeded(request, metrics.queries, budget)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.view_name = getattr(
+            request.resolver_match, 'view_name', None)
+        request.query_budget = getattr(view_func, 'query_budget', None)
+
+    def budget_exceeded(self, request, queries, budget):
+        message = (f'{request.view_name}: {queries} SQL-запросов '
+                   f'при бюджете {budget}')
+        if settings.QUERY_BUDGET_MODE == 'fail':
+            raise QueryBudgetExceeded(message)
+        if settings.QUERY_BUDGET_MODE == 'warn':
+            logger.warning(message)
+
+
+class ReplicaMiddleware:
+    """
+    Отправляет чтения страниц из REPLICA_VIEWS в случайную реплику из
+    DATABASE_REPLICAS, синхронизированную не раньше чем
+    REPLICA_LAG_TOLERANCE секунд назад; если таких нет, чтения остаются
+    в default. После запроса с записью в базу ставит cookie, которое
+    столько же секунд держит пользователя на default: когда оно
+    истекает, любая допустимая реплика уже содержит его запись. Решение
+    и отставание реплики сохраняются в request.db_route и
+    request.replica_lag и попадают в лог запроса.
+    """
+
+    SAFE_METHODS = ('GET', 'HEAD')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.db_route = None
+        request.replica_lag = None
+        route_reads(None)
+        try:
+            response = self.get_response(request)
+            if fell_back():
+                request.db_route = 'default:stale'
+            if wrote():
+                response.set_cookie(
+                    settings.REPLICA_PIN_COOKIE, '1',
+                    max_age=settings.REPLICA_LAG_TOLERANCE,
+                    httponly=True, samesite='Lax')
+        finally:
+            route_reads(None)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_name = getattr(request.resolver_match, 'view_name', None)
+        if (view_name not in settings.REPLICA_VIEWS
+                or not settings.DATABASE_REPLICAS):
+            return None
+        if request.method not in self.SAFE_METHODS:
+            request.db_route = 'default:write'
+        elif settings.REPLICA_PIN_COOKIE in request.COOKIES:
+            request.db_route = 'default:pinned'
+        else:
+            lags = replica_lags()
+            fresh = [alias for alias, lag in lags.items()
+                     if lag is not None
+                     and lag <= settings.REPLICA_LAG_TOLERANCE]
+            known = [lag for lag in lags.values() if lag is not None]
+            if not fresh:
+                request.db_route = 'default:lagging'
+                request.replica_lag = round(min(known), 1) if known else None
+                return None
+            alias = choose_replica(fresh)
+            request.db_route = f'{alias}:replica'
+            request.replica_lag = round(lags[alias], 1)
+            route_reads(alias)
+        return None
@@ -0,0 +1,94 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+SYNCED_KEY = 'replica_synced:{}'
+
+_state = threading.local()
+
+
+def route_reads(alias):
+    """Направляет чтения текущего потока в alias; None — в default."""
+    _state.alias = alias
+    _state.wrote = False
+    _state.fell_back = False
+
+
+def reading_from_replica():
+    return getattr(_state, 'alias', None) is not None
+
+
+def read_from_default():
+    """Переводит оставшиеся чтения запроса из реплики в default."""
+    if getattr(_state, 'alias', None) is not None:
+        _state.alias = None
+        _state.fell_back = True
+
+
+def fell_back():
+    """Переключал ли read_from_default() чтения текущего потока."""
+    return getattr(_state, 'fell_back', False)
+
+
+def wrote():
+    """Была ли в текущем потоке запись с последнего route_reads()."""
+    return getattr(_state, 'wrote', False)
+
+
+def mark_synced(alias, timestamp):
+    """Запоминает время, по состоянию на которое скопирована реплика."""
+    cache.set(SYNCED_KEY.format(alias), timestamp, None)
+
+
+def replica_lags():
+    """
+    Отставание каждой реплики в секундах с момента последней
+    sync_replicas. None — реплику ни разу не синхронизировали.
+    """
+    keys = {SYNCED_KEY.format(alias): alias
+            for alias in settings.DATABASE_REPLICAS}
+    synced = cache.get_many(keys)
+    now = time.time()
+    return {alias: now - synced[key] if key in synced else None
+            for key, alias in keys.items()}
+
+
+def replica_synced_before(timestamp):
+    """Скопирована ли реплика текущего потока раньше timestamp."""
+    alias = getattr(_state, 'alias', None)
+    if alias is None:
+        return False
+    synced = cache.get(SYNCED_KEY.format(alias))
+    return synced is None or synced < timestamp
+
+
+def choose_replica(aliases):
+    return random.choice(aliases)
+
+
+class ReplicaRouter:
+    """
+    Чтения моделей из REPLICA_APPS уходят в базу, выбранную для запроса
+    ReplicaMiddleware, записи и миграции — всегда в default. Сессии и
+    пользователи читаются из default: иначе только что вошедший
+    пользователь выглядел бы анонимом до следующей синхронизации.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in settings.REPLICA_APPS:
+            return None
+        return getattr(_state, 'alias', None)
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и default.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,157 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (FileResponse, Http404, HttpResponse,
+                         StreamingHttpResponse)
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+from sorl.thumbnail.conf import settings as sorl_settings
+
+from posts.storage import is_content_path
+
+# css/app.4f1c2b3a9d0e.css — имя, которое выдаёт ManifestStaticFilesStorage.
+HASHED_STATIC_RE = re.compile(r'\.[0-9a-f]{12}\.\w+$')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+CHUNK_SIZE = 64 * 1024
+
+
+def byte_range(header, size):
+    """
+    Границы одного диапазона из заголовка Range: (start, end) включительно.
+    None — диапазон не разобран или их несколько: отдаётся весь файл.
+    ValueError — диапазон за пределами файла.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end or size - 1), size - 1)
+    if start > end or start >= size:
+        raise ValueError(header)
+    return start, end
+
+
+def read_range(file, start, length):
+    with file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def negotiate(request, path):
+    """Путь к сжатой копии файла, которую принимает клиент, и её кодек."""
+    accepted = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    for encoding, extension in ENCODINGS:
+        if encoding in accepted and os.path.isfile(path + extension):
+            return path + extension, encoding
+    return path, None
+
+
+def serve(request, path, document_root, immutable=False):
+    """
+    Отдаёт файл из document_root с ETag, Last-Modified и поддержкой Range.
+    Неизменяемые файлы (с хэшем содержимого в имени) кэшируются клиентом
+    на год, остальные — на FILES_MAX_AGE с проверкой по ETag. При
+    SENDFILE_HEADER само чтение файла отдаётся веб-серверу.
+    """
+    try:
+        fullpath = safe_join(document_root, path)
+    except SuspiciousFileOperation:
+        raise Http404(path)
+    if not os.path.isfile(fullpath):
+        raise Http404(path)
+    filepath, encoding = negotiate(request, fullpath)
+    stat = os.stat(filepath)
+    etag = quote_etag(f'{int(stat.st_mtime):x}-{stat.st_size:x}'
+                      + (f'-{encoding}' if encoding else ''))
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = file_response(
+            request, filepath, filepath[len(fullpath):], stat, etag)
+    content_type, original_encoding = mimetypes.guess_type(fullpath)
+    response['Content-Type'] = content_type or 'application/octet-stream'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    elif original_encoding:
+        response['Content-Encoding'] = original_encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if immutable:
+        response['Cache-Control'] = (
+            f'public, max-age={settings.IMMUTABLE_FILES_MAX_AGE}, immutable')
+    else:
+        response['Cache-Control'] = (
+            f'public, max-age={settings.FILES_MAX_AGE}')
+    if filepath != fullpath or any(
+            os.path.isfile(fullpath + ext) for _, ext in ENCODINGS):
+        patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def file_response(request, filepath, suffix, stat, etag):
+    """Тело ответа: весь файл, диапазон или заголовок для веб-сервера."""
+    header = settings.SENDFILE_HEADER
+    if header == 'X-Sendfile':
+        response = HttpResponse()
+        response[header] = filepath
+        return response
+    if header == 'X-Accel-Redirect':
+        # nginx: internal-локация SENDFILE_INTERNAL_URL повторяет
+        # адреса статики и медиа и смотрит в те же каталоги.
+        response = HttpResponse()
+        response[header] = quote(
+            settings.SENDFILE_INTERNAL_URL.rstrip('/') + request.path + suffix)
+        return response
+    size = stat.st_size
+    requested = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if requested and not suffix and (not if_range or if_range == etag):
+        try:
+            bounds = byte_range(requested, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if bounds is not None:
+            start, end = bounds
+            response = StreamingHttpResponse(
+                read_range(open(filepath, 'rb'), start, end - start + 1),
+                status=206)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = end - start + 1
+            response['Accept-Ranges'] = 'bytes'
+            return response
+    response = FileResponse(open(filepath, 'rb'))
+    response['Content-Length'] = size
+    response['Accept-Ranges'] = 'none' if suffix else 'bytes'
+    return response
+
+
+@require_safe
+def serve_static(request, path):
+    return serve(request, path, settings.STATIC_ROOT,
+                 immutable=HASHED_STATIC_RE.search(path) is not None)
+
+
+@require_safe
+def serve_media(request, path):
+    # Имена картинок — хэш содержимого, имена миниатюр sorl — хэш
+    # исходника и параметров: по одному адресу всегда лежит один файл.
+    prefix = sorl_settings.THUMBNAIL_PREFIX.strip('/') + '/'
+    return serve(request, path, settings.MEDIA_ROOT,
+                 immutable=is_content_path(path) or path.startswith(prefix))
@@ -0,0 +1,59 @@
+import gzip
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {
+    '.css', '.js', '.json', '.map', '.svg', '.txt', '.html', '.xml',
+    '.ico', '.eot', '.ttf', '.otf',
+}
+
+
+def compressors():
+    """Расширение сжатой копии и функция сжатия для каждого кодека."""
+    yield '.gz', lambda data: gzip.compress(data, 9, mtime=0)
+    if brotli is not None:
+        yield '.br', lambda data: brotli.compress(data)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Статика с хэшем содержимого в имени и сжатыми копиями рядом:
+    css/app.4f1c….css.gz и .br (если установлен brotli). Копия остаётся,
+    только если она заметно меньше оригинала.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        processed = super().post_process(paths, dry_run=dry_run, **options)
+        names = set()
+        for name, hashed_name, done in processed:
+            yield name, hashed_name, done
+            if hashed_name and not isinstance(done, Exception):
+                names.update((name, hashed_name))
+        if dry_run:
+            return
+        for name in sorted(names):
+            if self.compressible(name):
+                self.compress(name)
+
+    def compressible(self, name):
+        return os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+    def compress(self, name):
+        path = self.path(name)
+        with open(path, 'rb') as file:
+            data = file.read()
+        if len(data) < settings.STATIC_COMPRESS_MIN_SIZE:
+            return
+        for extension, compress in compressors():
+            compressed = compress(data)
+            if len(compressed) >= len(data) * 0.95:
+                continue
+            with open(path + extension, 'wb') as file:
+                file.write(compressed)
@@ -1,31 +1,111 @@
+import hashlib
+
+from django.conf import settings
 from django.contrib import admin
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db.models import QuerySet
+from django.utils.encoding import force_bytes
 
+from .caching import get_generation
 from .models import Comment, Follow, Group, Post
+from .search import filter_posts
+from .utils import FeedPaginator
+
+
+class CachedDatesQuerySet(QuerySet):
+    """
+    Даты и границы периода для date_hierarchy берутся из кэша. Ключ
+    включает поколение главной ленты, которое меняется при любой
+    записи поста или комментария.
+    """
+
+    def _cached(self, name, compute):
+        try:
+            sql = str(self.query)
+        except EmptyResultSet:
+            return compute()
+        key = 'admin_dates:' + hashlib.md5(force_bytes(
+            f'{sql}|{name}|{get_generation("index")}')).hexdigest()
+        result = cache.get(key)
+        if result is None:
+            result = compute()
+            cache.set(key, result, settings.ADMIN_DATES_CACHE_TTL)
+        return result
+
+    def dates(self, field_name, kind, order='ASC'):
+        return self._cached(
+            f'dates:{field_name}:{kind}:{order}',
+            lambda: list(super(CachedDatesQuerySet, self).dates(
+                field_name, kind, order)))
+
+    def aggregate(self, *args, **kwargs):
+        return self._cached(
+            f'aggregate:{args}:{sorted(kwargs.items())}',
+            lambda: super(CachedDatesQuerySet, self).aggregate(
+                *args, **kwargs))
+
+
+class FastChangeListAdmin(admin.ModelAdmin):
+    """
+    Список объектов без COUNT(*) по всей таблице: количество
+    оценивает FeedPaginator, полный счётчик не выводится.
+    """
+
+    show_full_result_count = False
+    empty_value_display = '-пусто-'
+
+    def get_paginator(self, request, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True):
+        return FeedPaginator(queryset, per_page, orphans,
+                             allow_empty_first_page)
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if not self.date_hierarchy:
+            return queryset
+        return CachedDatesQuerySet(
+            queryset.model, queryset.query.chain(), queryset.db)
 
 
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(FastChangeListAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
-    empty_value_display = '-пусто-'
+    date_hierarchy = 'pub_date'
     list_editable = ('group',)
+    autocomplete_fields = ('author', 'group')
+
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по тексту идёт через полнотекстовый индекс."""
+        if not search_term.strip():
+            return queryset, False
+        return filter_posts(queryset, search_term), False
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(FastChangeListAdmin):
     list_display = ('pk', 'text', 'author', 'created')
-    search_fields = ('text', 'author')
+    list_select_related = ('author',)
+    search_fields = ('=author__username', 'text')
     list_filter = ('created',)
-    empty_value_display = '-пусто-'
+    date_hierarchy = 'created'
+    autocomplete_fields = ('post', 'author')
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(FastChangeListAdmin):
     list_display = ('pk', 'user', 'author')
-    search_fields = ('user', 'author')
-    list_filter = ('user',)
-    empty_value_display = '-пусто-'
+    list_select_related = ('user', 'author')
+    search_fields = ('=user__username', '=author__username')
+    autocomplete_fields = ('user', 'author')
+
+
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'title', 'slug', 'posts_count')
+    search_fields = ('title', 'slug')
 
 
 admin.site.register(Follow, FollowAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
+admin.site.register(Group, GroupAdmin)
@@ -0,0 +1,149 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+from django.middleware.csrf import get_token
+
+from core.routers import (read_from_default, reading_from_replica,
+                          replica_synced_before)
+
+from .models import Follow, Group, Post, UserStats
+
+GENERATION_KEY = 'feed_generation:{}'
+BUMPED_KEY = 'feed_bumped:{}'
+FRAGMENT_KEY = 'post_fragment:{}:{}:{}:{:f}:{}'
+
+
+def post_scopes(group_id, author_id):
+    """Ленты, на которых виден пост: главная, группа и профиль автора."""
+    scopes = ['index', f'author:{author_id}']
+    if group_id is not None:
+        scopes.append(f'group:{group_id}')
+    return scopes
+
+
+def get_generation(scope):
+    """
+    Номер поколения содержимого ленты. Входит в ключ кэша страниц,
+    поэтому смена поколения мгновенно делает старые страницы невидимыми.
+    """
+    key = GENERATION_KEY.format(scope)
+    generation = cache.get(key)
+    if generation is None:
+        # После вытеснения ключа начинаем с нового значения, чтобы не
+        # совпасть с поколением ещё живых в кэше страниц.
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    require_fresh_reads(scope)
+    return generation
+
+
+def require_fresh_reads(scope):
+    """
+    Переводит чтения запроса в default, если его реплика скопирована
+    раньше последнего изменения ленты. Иначе страница из устаревшей
+    реплики попала бы в кэш и в ETag под новым поколением.
+    """
+    if not reading_from_replica():
+        return
+    bumped = cache.get(BUMPED_KEY.format(scope))
+    if bumped is not None and replica_synced_before(bumped):
+        read_from_default()
+
+
+def bump_generations(scopes):
+    for scope in scopes:
+        key = GENERATION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), None)
+    # Реплики, синхронизированные раньше REPLICA_LAG_TOLERANCE секунд
+    # назад, не читаются, поэтому более старые отметки не нужны.
+    now = time.time()
+    cache.set_many({BUMPED_KEY.format(scope): now for scope in scopes},
+                   settings.REPLICA_LAG_TOLERANCE + 1)
+
+
+def feed_cache_context(scope):
+    """Параметры {% cache %} для списка постов ленты."""
+    return {
+        'feed_cache_timeout': settings.FEED_CACHE_TTL,
+        'feed_version': get_generation(scope),
+    }
+
+
+def post_fragments(posts, template_name, render, variant=''):
+    """
+    HTML постов ленты. Фрагменты берутся из кэша одним get_many по
+    ключу из id поста, updated_at и счётчика комментариев; рисуются
+    только отсутствующие, поэтому правка поста сбрасывает лишь его
+    фрагмент, а страница ленты вокруг собирается из готовых кусков.
+    """
+    keys = {
+        FRAGMENT_KEY.format(template_name, variant, post.pk,
+                            post.updated_at.timestamp(), post.comments_count):
+        post
+        for post in posts
+    }
+    fragments = cache.get_many(keys)
+    missing = {key: render(post) for key, post in keys.items()
+               if key not in fragments}
+    if missing:
+        cache.set_many(missing, settings.POST_FRAGMENT_TTL)
+        fragments.update(missing)
+    return [fragments[key] for key in keys]
+
+
+def page_etag(request, *parts):
+    """
+    ETag страницы: адрес с параметрами, пользователь и версии данных,
+    из которых она собрана. Совпадение значит, что HTML не изменился.
+    Вошедшему пользователю страницы показывают формы, поэтому в ETag
+    входит и секрет CSRF: он меняется при каждом входе, и без него
+    браузер оставил бы у себя форму со старым токеном.
+    """
+    secret = ''
+    if request.user.is_authenticated:
+        # get_token заводит секрет, если у браузера ещё нет cookie.
+        get_token(request)
+        secret = request.META['CSRF_COOKIE']
+    value = '|'.join(map(str, (
+        request.get_full_path(), request.user.pk, secret, *parts)))
+    return hashlib.md5(value.encode()).hexdigest()
+
+
+def index_etag(request):
+    return page_etag(request, get_generation('index'))
+
+
+def group_etag(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True).first()
+    if group_id is None:
+        return None
+    return page_etag(request, get_generation(f'group:{group_id}'))
+
+
+def profile_etag(request, username):
+    # Шапка профиля показывает счётчики подписок и кнопку подписки,
+    # которые не входят в поколение ленты автора.
+    stats = UserStats.objects.filter(user__username=username).annotate(
+        following=Exists(Follow.objects.filter(
+            user_id=request.user.pk, author_id=OuterRef('user_id')))
+    ).values_list('user_id', 'followers_count', 'following_count',
+                  'following').first()
+    if stats is None:
+        return None
+    return page_etag(request, get_generation(f'author:{stats[0]}'), *stats)
+
+
+def post_etag(request, post_id):
+    # Правка поста и комментарии к нему меняют поколение ленты автора.
+    author_id = Post.objects.filter(pk=post_id).values_list(
+        'author_id', flat=True).first()
+    if author_id is None:
+        return None
+    return page_etag(request, get_generation(f'author:{author_id}'))
@@ -0,0 +1,106 @@
+from django.db import connection
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Group, MediaFile, Post, User, UserStats
+
+
+def _change(queryset, field, delta):
+    # Счётчики беззнаковые, а расхождение с данными допустимо (его
+    # исправляет recount), поэтому уменьшение не опускается ниже нуля.
+    value = F(field) + delta
+    if delta < 0:
+        value = Greatest(value, 0)
+    return queryset.update(**{field: value})
+
+
+def change_user_counter(user_id, field, delta):
+    """Атомарно меняет счётчик пользователя на delta."""
+    updated = _change(UserStats.objects.filter(user_id=user_id), field, delta)
+    # Строки счётчиков может не быть у пользователей, созданных в обход
+    # сигналов; при уменьшении её не создаём — пользователь мог удаляться.
+    # Новая строка сразу получает настоящие значения: запись, о которой
+    # сообщает delta, уже сохранена и попадает в подсчёт.
+    if not updated and delta > 0:
+        _, created = UserStats.objects.get_or_create(
+            user_id=user_id, defaults=user_counts(user_id))
+        if not created:
+            _change(UserStats.objects.filter(user_id=user_id), field, delta)
+
+
+def user_counts(user_id):
+    """Счётчики пользователя, посчитанные по данным."""
+    return {
+        'posts_count': Post.objects.filter(author_id=user_id).count(),
+        'followers_count': Follow.objects.filter(author_id=user_id).count(),
+        'following_count': Follow.objects.filter(user_id=user_id).count(),
+    }
+
+
+def change_group_counter(group_id, delta):
+    if group_id is not None:
+        _change(Group.objects.filter(pk=group_id), 'posts_count', delta)
+
+
+def change_post_counter(post_id, delta):
+    _change(Post.objects.filter(pk=post_id), 'comments_count', delta)
+
+
+def change_media_counter(name, delta):
+    """Меняет число ссылок на файл картинки."""
+    if not name:
+        return
+    if delta < 0:
+        _change(MediaFile.objects.filter(name=name), 'references', delta)
+        return
+    # Строка создаётся и увеличивается одним запросом вместо
+    # get_or_create (SELECT, SAVEPOINT, INSERT) и отдельного UPDATE.
+    quote = connection.ops.quote_name
+    table = quote(MediaFile._meta.db_table)
+    name_column = quote(MediaFile._meta.get_field('name').column)
+    column = quote(MediaFile._meta.get_field('references').column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({name_column}, {column}) VALUES (%s, %s) '
+            f'ON CONFLICT ({name_column}) DO UPDATE '
+            f'SET {column} = {table}.{column} + excluded.{column}',
+            [name, delta])
+
+
+def _count(queryset, field, outer='pk'):
+    """Коррелированный подзапрос COUNT(*) для UPDATE."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef(outer)}).order_by().values(
+            field).annotate(total=Count('pk')).values('total')), 0)
+
+
+def recount():
+    """Пересчитывает все счётчики набором UPDATE ... SELECT COUNT(*)."""
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=pk) for pk in User.objects.filter(
+            stats__isnull=True).values_list('pk', flat=True).iterator()),
+        ignore_conflicts=True,
+    )
+    return {
+        'posts': Post.objects.update(
+            comments_count=_count(Comment.objects, 'post')),
+        'groups': Group.objects.update(
+            posts_count=_count(Post.objects, 'group')),
+        'users': UserStats.objects.update(
+            posts_count=_count(Post.objects, 'author', 'user_id'),
+            followers_count=_count(Follow.objects, 'author', 'user_id'),
+            following_count=_count(Follow.objects, 'user', 'user_id'),
+        ),
+        'media': recount_media(),
+    }
+
+
+def recount_media():
+    """Пересчитывает ссылки постов на файлы картинок."""
+    images = Post.objects.exclude(image='').order_by().values('image')
+    MediaFile.objects.bulk_create(
+        (MediaFile(name=row['image']) for row in images.distinct().iterator()),
+        ignore_conflicts=True,
+    )
+    return MediaFile.objects.update(references=_count(
+        Post.objects, 'image', 'name'))
@@ -0,0 +1,182 @@
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils.functional import cached_property
+
+from .models import Follow, Post, TimelineEntry, UserStats
+
+HIGH_FOLLOWER_KEY = 'feeds:high_follower_authors:{}'
+
+
+def high_follower_authors():
+    """
+    Авторы, у которых подписчиков больше FEED_FANOUT_THRESHOLD.
+    Их посты не раскладываются по лентам, а подмешиваются при чтении.
+    """
+    threshold = settings.FEED_FANOUT_THRESHOLD
+    key = HIGH_FOLLOWER_KEY.format(threshold)
+    authors = cache.get(key)
+    if authors is None:
+        authors = frozenset(UserStats.objects.filter(
+            followers_count__gt=threshold).values_list('user_id', flat=True))
+        cache.set(key, authors, settings.FEED_HIGH_FOLLOWER_TTL)
+    return authors
+
+
+def _bulk_insert(entries):
+    """Вставляет записи ленты пачками, не собирая их все в памяти."""
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, settings.TIMELINE_BATCH_SIZE))
+        if not batch:
+            return
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def push_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if post.author_id in high_follower_authors():
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post.pk,
+                      pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+def backfill_timeline(user_id, author_id):
+    """Добавляет в ленту подписчика уже опубликованные посты автора."""
+    if author_id in high_follower_authors():
+        return
+    posts = Post.objects.filter(
+        author_id=author_id).values_list('pk', 'pub_date')
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+        for pk, pub_date in posts.iterator()
+    )
+
+
+def prune_timeline(user_id, author_id):
+    """Убирает из ленты подписчика посты автора."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+def rebuild_timelines(user_ids=None):
+    """
+    Пересобирает ленты подписок одним INSERT ... SELECT.
+    Без user_ids пересобираются ленты всех пользователей.
+    Посты авторов с большим числом подписчиков не раскладываются.
+    """
+    sql = (
+        f'INSERT INTO {TimelineEntry._meta.db_table} '
+        f'(user_id, post_id, pub_date) '
+        f'SELECT f.user_id, p.id, p.pub_date '
+        f'FROM {Follow._meta.db_table} f '
+        f'INNER JOIN {Post._meta.db_table} p ON p.author_id = f.author_id'
+    )
+    entries = TimelineEntry.objects.all()
+    conditions = []
+    params = []
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return 0
+        entries = entries.filter(user_id__in=user_ids)
+        conditions.append('f.user_id IN ({})'.format(
+            ', '.join(['%s'] * len(user_ids))))
+        params.extend(user_ids)
+    pulled = list(high_follower_authors())
+    if pulled:
+        conditions.append('f.author_id NOT IN ({})'.format(
+            ', '.join(['%s'] * len(pulled))))
+        params.extend(pulled)
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    with transaction.atomic():
+        entries.delete()
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
+
+
+class HybridFeed:
+    """
+    Лента подписок пользователя для пагинатора.
+
+    Посты обычных авторов читаются из материализованной ленты,
+    последние FEED_PULL_DEPTH постов авторов с большим числом
+    подписчиков подмешиваются при чтении слиянием отсортированных
+    потоков (pub_date, id).
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def pulled_authors(self):
+        high = high_follower_authors()
+        if not high:
+            return []
+        return list(Follow.objects.filter(
+            user=self.user, author_id__in=high).values_list(
+            'author_id', flat=True))
+
+    def _timeline(self, limit):
+        return TimelineEntry.objects.filter(user=self.user).order_by(
+            '-pub_date', '-post_id').values_list(
+            'pub_date', 'post_id')[:limit]
+
+    def _pulled(self, limit):
+        if not self.pulled_authors:
+            return Post.objects.none()
+        return Post.objects.filter(
+            author_id__in=self.pulled_authors).order_by(
+            '-pub_date', '-pk').values_list('pub_date', 'pk')[
+            :min(limit, settings.FEED_PULL_DEPTH)]
+
+    @property
+    def count_key(self):
+        """Ключ закэшированного количества для FeedPaginator."""
+        return f'paginator_count:follow:{self.user.pk}'
+
+    def count(self, limit=None):
+        """Число постов ленты; с limit — не больше limit записей."""
+        timeline = TimelineEntry.objects.filter(user=self.user)
+        if limit is not None:
+            timeline = timeline[:limit]
+        total = timeline.count()
+        if self.pulled_authors:
+            total += self._pulled(settings.FEED_PULL_DEPTH).count()
+        return total if limit is None else min(total, limit)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start, stop = key.start or 0, key.stop
+        if stop is None:
+            stop = self.count()
+        if stop <= start:
+            return []
+        ids = []
+        seen = set()
+        merged = heapq.merge(
+            self._timeline(stop), self._pulled(stop), reverse=True)
+        for _, pk in merged:
+            if pk in seen:
+                continue
+            seen.add(pk)
+            ids.append(pk)
+            if len(ids) >= stop:
+                break
+        ids = ids[start:]
+        posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
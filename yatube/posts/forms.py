@@ -1,6 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 from django.utils.translation import gettext_lazy as _
 
+from .images import normalize_image
 from .models import Comment, Post
 
 
@@ -18,12 +20,21 @@ class PostForm(forms.ModelForm):
             'group': _('Группа не обязательна, но я настаиваю 😡')
         }
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, upload_errors=None, **kwargs):
         super().__init__(*args, **kwargs)
+        self.upload_errors = upload_errors or {}
         self.fields['text'].widget.attrs['placeholder'] = (
             'Введите какой нибудь текст, ну пожалуйста 🥺')
         self.fields['group'].empty_label = ('Выберите группу 👀')
 
+    def clean_image(self):
+        if 'image' in self.upload_errors:
+            raise forms.ValidationError(self.upload_errors['image'])
+        image = self.cleaned_data['image']
+        if isinstance(image, UploadedFile):
+            return normalize_image(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
 
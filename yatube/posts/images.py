@@ -0,0 +1,92 @@
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from PIL import Image, ImageOps
+
+HASH_CHUNK_SIZE = 64 * 1024
+MIME_TYPES = {
+    'AVIF': 'image/avif',
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'GIF': 'image/gif',
+}
+
+
+def image_metadata(file):
+    """
+    Размеры, формат, объём и sha256 картинки. Pillow читает только
+    заголовок, содержимое файла проходит через хэш кусками.
+    """
+    file.seek(0)
+    with Image.open(file) as image:
+        width, height = image.size
+        image_format = image.format
+    file.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+        size += len(chunk)
+    file.seek(0)
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_size': size,
+        'image_format': image_format or '',
+        'image_hash': digest.hexdigest(),
+    }
+
+
+EMPTY_METADATA = {
+    'image_width': None,
+    'image_height': None,
+    'image_size': None,
+    'image_format': '',
+    'image_hash': '',
+}
+
+
+def saveable_formats(formats):
+    """Форматы из списка, которые установленный Pillow умеет сохранять."""
+    Image.init()
+    return [image_format for image_format in formats
+            if image_format in Image.SAVE]
+
+
+def normalize_image(file):
+    """
+    Убирает EXIF и уменьшает картинку, если её сторона больше
+    IMAGE_MAX_DIMENSION. Результат пишется во временный файл на диске;
+    картинки без EXIF и в пределах размера возвращаются как есть.
+    """
+    limit = settings.IMAGE_MAX_DIMENSION
+    file.seek(0)
+    with Image.open(file) as image:
+        oversized = max(image.size) > limit
+        if not oversized and not image.getexif():
+            file.seek(0)
+            return file
+        image_format = image.format
+        # JPEG декодируется сразу в уменьшенном масштабе — меньше памяти.
+        image.draft(image.mode, (limit, limit))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((limit, limit))
+        image.info.pop('exif', None)
+        name = os.path.basename(file.name)
+        content_type = getattr(file, 'content_type', None)
+        Image.init()
+        if image_format not in Image.SAVE:
+            # Форматы, которые Pillow только читает (PSD и подобные),
+            # сохраняются в PNG, а без прозрачности — в JPEG.
+            image_format = ('JPEG' if image.mode in ('RGB', 'L', 'CMYK')
+                            else 'PNG')
+            name = os.path.splitext(name)[0] + '.' + image_format.lower()
+            content_type = MIME_TYPES[image_format]
+        normalized = TemporaryUploadedFile(name, content_type, 0, None)
+        image.save(normalized, format=image_format)
+    normalized.size = normalized.tell()
+    normalized.seek(0)
+    return normalized
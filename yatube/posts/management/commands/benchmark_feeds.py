@@ -0,0 +1,120 @@
+import random
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from posts.counters import recount
+from posts.feeds import HIGH_FOLLOWER_KEY, HybridFeed, rebuild_timelines
+from posts.management.commands.benchmark_views import percentile
+from posts.models import Follow, Post, TimelineEntry, User
+
+PAGE = 10
+DEEP_PAGE_START = 100
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает pull, push и hybrid ленты подписок на синтетическом '
+        'графе подписок. Все данные создаются в транзакции и '
+        'откатываются в конце.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--follows', type=int, default=50,
+                            help='Подписок на одного пользователя.')
+        parser.add_argument('--posts', type=int, default=20,
+                            help='Постов на одного автора.')
+        parser.add_argument('--threshold', type=int, default=200,
+                            help='FEED_FANOUT_THRESHOLD для hybrid.')
+        parser.add_argument('--depth', type=int, default=500,
+                            help='FEED_PULL_DEPTH для всех режимов.')
+        parser.add_argument('--readers', type=int, default=100)
+        parser.add_argument('--writes', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        with transaction.atomic():
+            users = self.seed(options)
+            modes = (
+                ('pull', -1),
+                ('push', len(users) + 1),
+                ('hybrid', options['threshold']),
+            )
+            self.stdout.write(
+                f'{"mode":<8}{"rebuild s":>10}{"rows":>10}'
+                f'{"write ms":>10}{"read p50":>10}{"read p95":>10}'
+                f'{"deep p95":>10}{"queries":>9}')
+            for name, threshold in modes:
+                # Набор авторов для подмешивания мог остаться в кэше от
+                # прошлого запуска, чьи данные откатились.
+                cache.delete(HIGH_FOLLOWER_KEY.format(threshold))
+                with override_settings(FEED_FANOUT_THRESHOLD=threshold,
+                                       FEED_PULL_DEPTH=options['depth']):
+                    self.stdout.write(self.run_mode(name, users, options))
+            transaction.set_rollback(True)
+
+    def seed(self, options):
+        User.objects.bulk_create(
+            User(username=f'bench_feed_{i}') for i in range(options['users']))
+        users = list(User.objects.filter(
+            username__startswith='bench_feed_').values_list('pk', flat=True))
+        # Распределение Ципфа: немногие авторы собирают большую часть
+        # подписок, как в реальной социальной сети.
+        weights = [1 / (rank + 1) for rank in range(len(users))]
+        follows = []
+        for user_id in users:
+            authors = set(self.random.choices(
+                users, weights, k=options['follows']))
+            authors.discard(user_id)
+            follows.extend(Follow(user_id=user_id, author_id=author_id)
+                           for author_id in authors)
+        Follow.objects.bulk_create(follows)
+        Post.objects.bulk_create(
+            (Post(author_id=author_id, text='benchmark')
+             for author_id in users for _ in range(options['posts'])))
+        # bulk_create обходит сигналы: без пересчёта у авторов нет
+        # followers_count, и hybrid и pull работали бы как push.
+        recount()
+        return users
+
+    def run_mode(self, name, users, options):
+        started = time.perf_counter()
+        rebuild_timelines()
+        rebuild = time.perf_counter() - started
+
+        writers = users[:options['writes'] // 2] + self.random.sample(
+            users, options['writes'] - options['writes'] // 2)
+        started = time.perf_counter()
+        for author_id in writers:
+            Post.objects.create(author_id=author_id, text='benchmark')
+        write = (time.perf_counter() - started) / len(writers) * 1000
+        rows = TimelineEntry.objects.count()
+        if name == 'pull' and rows:
+            raise CommandError(
+                f'pull записал в ленты {rows} строк вместо 0')
+
+        reads, deep_reads, queries = [], [], []
+        for user_id in self.random.sample(users, options['readers']):
+            user = User(pk=user_id)
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                HybridFeed(user)[0:PAGE]
+                reads.append(time.perf_counter() - started)
+            queries.append(len(captured))
+            started = time.perf_counter()
+            HybridFeed(user)[DEEP_PAGE_START:DEEP_PAGE_START + PAGE]
+            deep_reads.append(time.perf_counter() - started)
+        TimelineEntry.objects.all().delete()
+        return (
+            f'{name:<8}{rebuild:>10.2f}{rows:>10}{write:>10.2f}'
+            f'{statistics.median(reads) * 1000:>10.2f}'
+            f'{percentile(reads, 0.95) * 1000:>10.2f}'
+            f'{percentile(deep_reads, 0.95) * 1000:>10.2f}'
+            f'{statistics.mean(queries):>9.1f}'
+        )
@@ -0,0 +1,252 @@
+import json
+import logging
+import os
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.counters import recount
+from posts.feeds import rebuild_timelines
+from posts.models import Comment, Follow, Group, Post, User
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'benchmarks', 'views.json')
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет временную базу десятками тысяч записей, измеряет число '
+        'SQL-запросов и задержки p50/p95 для всех URL из posts/urls.py и '
+        'сравнивает число запросов с эталоном, а задержки — с отчётом '
+        'прошлого прогона на этой же машине, если он указан. Завершается '
+        'с ошибкой при регрессии.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20000)
+        parser.add_argument('--posts', type=int, default=50000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument('--follows', type=int, default=100000)
+        parser.add_argument('--hot-comments', type=int, default=5000,
+                            help='Комментариев у одного популярного поста.')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--report', help='Куда записать JSON-отчёт.')
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                            help='Эталон числа запросов из репозитория.')
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='Записать число запросов как новый эталон.')
+        parser.add_argument('--time-baseline',
+                            help='Отчёт --report прошлого прогона на этой '
+                                 'же машине; без него задержки не '
+                                 'сравниваются.')
+        parser.add_argument('--time-tolerance', type=float, default=0.5,
+                            help='Допустимый рост p95 в долях эталона.')
+        parser.add_argument('--time-slack', type=float, default=2.0,
+                            help='Допустимый рост p95 в мс сверх доли, '
+                                 'гасит шум на быстрых страницах.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        requests_logger = logging.getLogger('yatube.requests')
+        level = requests_logger.level
+        requests_logger.setLevel(logging.WARNING)
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write('Заполнение базы...')
+            fixtures = self.seed(options)
+            results = self.measure(fixtures, options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            requests_logger.setLevel(level)
+        report = {
+            'dataset': {name: options[name] for name in (
+                'users', 'posts', 'comments', 'follows', 'hot_comments')},
+            'results': results,
+        }
+        self.print_results(results)
+        if options['report']:
+            with open(options['report'], 'w') as report_file:
+                json.dump(report, report_file, indent=2, ensure_ascii=False)
+        if options['update_baseline']:
+            # Задержки зависят от машины, поэтому в эталон из репозитория
+            # попадает только число запросов.
+            baseline = dict(report, results={
+                name: {'url': result['url'], 'queries': result['queries']}
+                for name, result in results.items()})
+            os.makedirs(os.path.dirname(options['baseline']), exist_ok=True)
+            with open(options['baseline'], 'w') as baseline_file:
+                json.dump(baseline, baseline_file, indent=2,
+                          ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS('Эталон обновлён.'))
+            return
+        if not os.path.exists(options['baseline']):
+            self.stdout.write(self.style.WARNING(
+                'Эталона нет, сравнение пропущено.'))
+            return
+        with open(options['baseline']) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        time_baseline = None
+        if options['time_baseline']:
+            with open(options['time_baseline']) as baseline_file:
+                time_baseline = json.load(baseline_file)['results']
+        regressions = self.compare(
+            results, baseline, time_baseline, options['time_tolerance'],
+            options['time_slack'])
+        if regressions:
+            raise CommandError('Регрессии:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Регрессий нет.'))
+
+    def seed(self, options):
+        User.objects.bulk_create(
+            User(username=f'bench_{i}') for i in range(options['users']))
+        users = list(User.objects.values_list('pk', flat=True))
+        Group.objects.bulk_create(
+            Group(title=f'group {i}', slug=f'group-{i}', description='-')
+            for i in range(100))
+        groups = list(Group.objects.values_list('pk', flat=True))
+        Post.objects.bulk_create(
+            Post(author_id=self.random.choice(users),
+                 group_id=self.random.choice(groups + [None]),
+                 text=f'benchmark post {i}')
+            for i in range(options['posts']))
+        posts = list(Post.objects.values_list('pk', flat=True))
+        hot_post = posts[-1]
+        Comment.objects.bulk_create(
+            Comment(post_id=hot_post if i < options['hot_comments']
+                    else self.random.choice(posts),
+                    author_id=self.random.choice(users),
+                    text=f'benchmark comment {i}')
+            for i in range(options['comments']))
+        pairs = set()
+        reader = users[0]
+        # Первый пользователь подписан на многих: худший случай /follow/.
+        for author in users[1:1 + options['follows'] // 10]:
+            pairs.add((reader, author))
+        while len(pairs) < options['follows']:
+            user, author = self.random.sample(users, 2)
+            pairs.add((user, author))
+        Follow.objects.bulk_create(
+            Follow(user_id=user, author_id=author) for user, author in pairs)
+        rebuild_timelines()
+        recount()
+        author = User.objects.get(pk=Post.objects.get(pk=hot_post).author_id)
+        return {
+            'reader': User.objects.get(pk=reader),
+            'author': author,
+            'post': hot_post,
+            'group': Group.objects.get(pk=groups[0]).slug,
+        }
+
+    def scenarios(self, fixtures):
+        post = {'post_id': fixtures['post']}
+        author = {'username': fixtures['author'].username}
+        deep = {'page': 1000}
+        return (
+            ('index', 'get', reverse('posts:index'), None, None),
+            ('index_deep_offset', 'get', reverse('posts:index'), deep, None),
+            ('search', 'get', reverse('posts:search'),
+             {'q': 'benchmark post'}, None),
+            ('group_list', 'get', reverse(
+                'posts:group_list', kwargs={'slug': fixtures['group']}),
+             None, None),
+            ('profile', 'get', reverse('posts:profile', kwargs=author),
+             None, None),
+            ('post_detail', 'get', reverse(
+                'posts:post_detail', kwargs=post), None, None),
+            ('post_comments', 'get', reverse(
+                'posts:post_comments', kwargs=post), None, None),
+            ('follow_index', 'get', reverse('posts:follow_index'),
+             None, 'reader'),
+            ('profile_follow', 'get', reverse(
+                'posts:profile_follow', kwargs=author), None, 'reader'),
+            ('profile_unfollow', 'get', reverse(
+                'posts:profile_unfollow', kwargs=author), None, 'reader'),
+            ('post_create_form', 'get', reverse('posts:post_create'),
+             None, 'reader'),
+            ('post_create', 'post', reverse('posts:post_create'),
+             {'text': 'benchmark'}, 'reader'),
+            ('post_edit_form', 'get', reverse(
+                'posts:post_edit', kwargs=post), None, 'author'),
+            ('post_edit', 'post', reverse('posts:post_edit', kwargs=post),
+             {'text': 'benchmark edit'}, 'author'),
+            ('add_comment', 'post', reverse(
+                'posts:add_comment', kwargs=post),
+             {'text': 'benchmark'}, 'reader'),
+        )
+
+    def measure(self, fixtures, repeat):
+        clients = {None: Client()}
+        for role in ('reader', 'author'):
+            clients[role] = Client()
+            clients[role].force_login(fixtures[role])
+        results = {}
+        for name, method, url, data, role in self.scenarios(fixtures):
+            client = clients[role]
+            timings, queries = [], []
+            for _ in range(repeat):
+                # Каждый замер — полная отрисовка: из кэша страниц и
+                # фрагментов повторы мерили бы только его чтение.
+                cache.clear()
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = getattr(client, method)(url, data)
+                    timings.append(time.perf_counter() - started)
+                if response.status_code >= 400:
+                    raise CommandError(
+                        f'{name}: {url} ответил {response.status_code}')
+                queries.append(len(captured))
+            results[name] = {
+                'url': url,
+                'queries': max(queries),
+                'first_ms': round(timings[0] * 1000, 2),
+                'p50_ms': round(statistics.median(timings) * 1000, 2),
+                'p95_ms': round(percentile(timings, 0.95) * 1000, 2),
+            }
+        return results
+
+    def compare(self, results, baseline, time_baseline=None,
+                tolerance=0.5, slack=2.0):
+        """
+        Регрессии относительно эталона: рост числа запросов и, если
+        передан отчёт прошлого прогона на этой машине, рост p95.
+        """
+        regressions = []
+        for name, result in results.items():
+            expected = baseline.get(name)
+            if expected is not None and (
+                    result['queries'] > expected['queries']):
+                regressions.append(
+                    f'{name}: запросов {result["queries"]}, '
+                    f'эталон {expected["queries"]}')
+            timed = (time_baseline or {}).get(name)
+            if timed is None:
+                continue
+            limit = timed['p95_ms'] * (1 + tolerance) + slack
+            if result['p95_ms'] > limit:
+                regressions.append(
+                    f'{name}: p95 {result["p95_ms"]} мс, '
+                    f'допустимо {limit:.2f} мс')
+        return regressions
+
+    def print_results(self, results):
+        self.stdout.write(
+            f'{"view":<20}{"queries":>8}{"first ms":>10}'
+            f'{"p50 ms":>10}{"p95 ms":>10}')
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<20}{result["queries"]:>8}{result["first_ms"]:>10}'
+                f'{result["p50_ms"]:>10}{result["p95_ms"]:>10}')
@@ -0,0 +1,128 @@
+import os
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from posts.models import MediaFile, Post
+from posts.thumbnails import delete_image
+
+
+def walk(root, directory):
+    """
+    Файлы каталога directory внутри root: (имя в хранилище, mtime).
+    os.scandir отдаёт записи по одной, поэтому даже плоский каталог
+    с миллионами файлов не читается в память целиком.
+    """
+    stack = [os.path.join(root, directory)]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    name = os.path.relpath(entry.path, root)
+                    yield (name.replace(os.sep, '/'),
+                           entry.stat(follow_symlinks=False).st_mtime)
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    return iter(lambda: list(islice(iterator, size)), [])
+
+
+class Command(BaseCommand):
+    help = ('Удаляет файлы картинок, на которые не ссылается ни один '
+            'пост, их миниатюры и миниатюры, которых нет в хранилище '
+            'sorl-thumbnail.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать, что было бы удалено.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--min-age', type=int,
+                            default=settings.MEDIA_MIN_AGE,
+                            help='Не трогать файлы моложе стольких секунд: '
+                                 'их может ещё дописывать загрузка.')
+        parser.add_argument('--rate', type=float, default=200,
+                            help='Не больше стольких удалений в секунду, '
+                                 '0 — без ограничения.')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.deleted = 0
+        self.started = time.monotonic()
+        self.cutoff = time.time() - options['min_age']
+        storage = Post._meta.get_field('image').storage
+        upload_to = Post._meta.get_field('image').upload_to.strip('/')
+        images = self.collect_images(storage, upload_to)
+        thumbnails = self.collect_thumbnails()
+        verb = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb}: картинок {images}, миниатюр {thumbnails}'))
+
+    def old_enough(self, files):
+        return [name for name, mtime in files if mtime < self.cutoff]
+
+    def report(self, message):
+        if self.options['verbosity'] > 1 or self.options['dry_run']:
+            self.stdout.write(message)
+
+    def throttle(self):
+        """Держит темп удалений не выше --rate в секунду."""
+        self.deleted += 1
+        if not self.options['rate']:
+            return
+        ahead = (self.deleted / self.options['rate']
+                 - (time.monotonic() - self.started))
+        if ahead > 0:
+            time.sleep(ahead)
+
+    def collect_images(self, storage, directory):
+        removed = 0
+        files = walk(storage.location, directory)
+        for batch in batches(files, self.options['batch_size']):
+            names = self.old_enough(batch)
+            referenced = set(MediaFile.objects.filter(
+                name__in=names, references__gt=0).values_list(
+                    'name', flat=True))
+            candidates = [name for name in names if name not in referenced]
+            # Счётчик мог разойтись после записей в обход сигналов,
+            # поэтому кандидатов без ссылок сверяем с постами.
+            used = set(Post.objects.filter(
+                image__in=candidates).values_list('image', flat=True))
+            for name in candidates:
+                if name in used:
+                    continue
+                removed += 1
+                self.report(f'картинка {name}')
+                if self.options['dry_run']:
+                    continue
+                delete_image(name)
+                MediaFile.objects.filter(name=name).delete()
+                self.throttle()
+        return removed
+
+    def collect_thumbnails(self):
+        removed = 0
+        files = walk(default.storage.location,
+                     sorl_settings.THUMBNAIL_PREFIX.strip('/'))
+        for batch in batches(files, self.options['batch_size']):
+            for name in self.old_enough(batch):
+                thumbnail = ImageFile(name, default.storage)
+                if default.kvstore.get(thumbnail) is not None:
+                    continue
+                removed += 1
+                self.report(f'миниатюра {name}')
+                if not self.options['dry_run']:
+                    thumbnail.delete()
+                    self.throttle()
+        return removed
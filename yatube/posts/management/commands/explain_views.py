@@ -0,0 +1,106 @@
+import logging
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post, User
+
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)$')
+TEMP_SORT = 'USE TEMP B-TREE'
+NO_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет страницы приложения posts на текущей базе, прогоняет '
+        'их SELECT-запросы через EXPLAIN QUERY PLAN и отмечает полные '
+        'просмотры таблиц и сортировки во временном B-дереве.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--username',
+            help='Пользователь для ленты подписок. По умолчанию тот, '
+                 'у кого больше всего подписок.')
+        parser.add_argument('--verbose-plans', action='store_true',
+                            help='Печатать планы всех запросов.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Поддерживается только SQLite.')
+        self.tables = set(connection.introspection.table_names())
+        requests_logger = logging.getLogger('yatube.requests')
+        level = requests_logger.level
+        requests_logger.setLevel(logging.WARNING)
+        problems = 0
+        with override_settings(CACHES=NO_CACHE), transaction.atomic():
+            for name, url, user in self.urls(options['username']):
+                client = Client()
+                if user is not None:
+                    client.force_login(user)
+                with CaptureQueriesContext(connection) as captured:
+                    client.get(url)
+                for query in captured:
+                    problems += self.explain(name, query['sql'], options)
+            transaction.set_rollback(True)
+        requests_logger.setLevel(level)
+        if problems:
+            raise CommandError(f'Проблемных планов: {problems}')
+        self.stdout.write(self.style.SUCCESS('Все планы используют индексы.'))
+
+    def urls(self, username):
+        post = Comment.objects.values_list('post_id', flat=True).first()
+        if post is None:
+            post = Post.objects.values_list('pk', flat=True).first()
+        author = Post.objects.values_list(
+            'author__username', flat=True).first()
+        group = Group.objects.values_list('slug', flat=True).first()
+        if username:
+            reader = User.objects.get(username=username)
+        else:
+            reader = User.objects.filter(
+                stats__following_count__gt=0).order_by(
+                '-stats__following_count').first()
+        if post is None or reader is None:
+            raise CommandError('В базе нет постов или подписок.')
+        urls = [
+            ('index', reverse('posts:index'), None),
+            ('index?page=2', reverse('posts:index') + '?page=2', None),
+            ('profile', reverse(
+                'posts:profile', kwargs={'username': author}), None),
+            ('post_detail', reverse(
+                'posts:post_detail', kwargs={'post_id': post}), None),
+            ('post_comments', reverse(
+                'posts:post_comments', kwargs={'post_id': post}), None),
+            ('follow_index', reverse('posts:follow_index'), reader),
+        ]
+        if group is not None:
+            urls.append(('group_list', reverse(
+                'posts:group_list', kwargs={'slug': group}), None))
+        return urls
+
+    def explain(self, name, sql, options):
+        if not sql.lstrip().upper().startswith('SELECT'):
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            plan = [row[-1] for row in cursor.fetchall()]
+        bad = [step for step in plan
+               if TEMP_SORT in step or self.is_full_scan(step)]
+        if bad or options['verbose_plans']:
+            style = self.style.ERROR if bad else self.style.SUCCESS
+            self.stdout.write(style(f'{name}: {sql}'))
+            for step in plan:
+                self.stdout.write(f'    {step}')
+        return len(bad)
+
+    def is_full_scan(self, step):
+        # Просмотр подзапроса-сопрограммы не считается полным просмотром.
+        match = FULL_SCAN.match(step)
+        return bool(match) and match.group(1) in self.tables
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts.images import EMPTY_METADATA, image_metadata
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Заполняет размеры, формат, объём и хэш картинок постов, '
+            'загруженных до появления этих полей.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').filter(
+            image_hash='').only('image').order_by('pk')
+        fields = [*EMPTY_METADATA, 'updated_at']
+        filled = missing = last_pk = 0
+        while True:
+            batch = list(posts.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            for post in batch:
+                try:
+                    with post.image.open('rb') as file:
+                        post.set_image_metadata(image_metadata(file))
+                        post.updated_at = timezone.now()
+                except (OSError, ValueError) as error:
+                    missing += 1
+                    self.stderr.write(f'{post.image.name}: {error}')
+            Post.objects.bulk_update(
+                [post for post in batch if post.image_hash], fields)
+            filled += sum(1 for post in batch if post.image_hash)
+        self.stdout.write(self.style.SUCCESS(
+            f'Заполнено: {filled}, не прочитано: {missing}'))
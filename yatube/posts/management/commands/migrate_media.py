@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts.counters import recount_media
+from posts.images import image_metadata
+from posts.models import Post
+from posts.storage import is_content_path
+
+
+class Command(BaseCommand):
+    help = ('Переносит картинки постов из плоского каталога posts/ '
+            'в хранилище по хэшу содержимого и пересчитывает ссылки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--keep-old', action='store_true',
+                            help='Не удалять файлы по старым путям.')
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        posts = Post.objects.exclude(image='').only('image').order_by('pk')
+        moved = missing = last_pk = 0
+        while True:
+            batch = list(posts.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            for post in batch:
+                old_name = post.image.name
+                if is_content_path(old_name):
+                    continue
+                try:
+                    with storage.open(old_name, 'rb') as file:
+                        metadata = image_metadata(file)
+                        new_name = storage.save(old_name, file)
+                except (OSError, ValueError) as error:
+                    missing += 1
+                    self.stderr.write(f'{old_name}: {error}')
+                    continue
+                # update() в обход сигналов: ссылки пересчитываются в конце.
+                Post.objects.filter(pk=post.pk).update(
+                    image=new_name, updated_at=timezone.now(), **metadata)
+                moved += 1
+                if (not options['keep_old']
+                        and not Post.objects.filter(image=old_name).exists()):
+                    storage.delete(old_name)
+        recount_media()
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено: {moved}, не прочитано: {missing}. '
+            f'Миниатюры для новых путей создаст warm_thumbnails.'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts.search import install, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс постов с нуля.'
+
+    def handle(self, *args, **options):
+        install()
+        rebuild()
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс пересобран.'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts.feeds import rebuild_timelines
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок с нуля.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Пересобрать ленты только этих пользователей.')
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['usernames']:
+            user_ids = User.objects.filter(
+                username__in=options['usernames']).values_list(
+                'pk', flat=True)
+        created = rebuild_timelines(user_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах создано: {created}'))
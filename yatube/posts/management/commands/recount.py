@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import recount
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики постов, групп и подписок.'
+
+    def handle(self, *args, **options):
+        for name, updated in recount().items():
+            self.stdout.write(f'{name}: обновлено {updated}')
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны.'))
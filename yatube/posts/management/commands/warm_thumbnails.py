@@ -0,0 +1,47 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.caching import bump_generations
+from posts.models import Post
+from posts.thumbnails import generate_thumbnails
+
+
+def _warm_in_process(post_ids):
+    try:
+        return generate_thumbnails(post_ids)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = ('Создаёт недостающие миниатюры для всех постов с картинками, '
+            'распределяя работу по процессам.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Число процессов, 1 — без пула.')
+        parser.add_argument('--chunk-size', type=int, default=100,
+                            help='Постов на одно задание.')
+
+    def handle(self, *args, **options):
+        post_ids = Post.objects.exclude(image='').order_by(
+            '-pk').values_list('pk', flat=True).iterator()
+        chunks = list(iter(
+            lambda: list(islice(post_ids, options['chunk_size'])), []))
+        scopes = set()
+        if options['workers'] == 1:
+            for chunk_scopes in map(generate_thumbnails, chunks):
+                scopes.update(chunk_scopes)
+        else:
+            # Дочерние процессы открывают свои соединения с базой.
+            connections.close_all()
+            with ProcessPoolExecutor(options['workers']) as executor:
+                for chunk_scopes in executor.map(_warm_in_process, chunks):
+                    scopes.update(chunk_scopes)
+        bump_generations(scopes)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано постов с картинками: {sum(map(len, chunks))}'))
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+from posts import search
+
+
+def install_index(apps, schema_editor):
+    search.install(schema_editor.connection)
+    search.rebuild(schema_editor.connection)
+
+
+def uninstall_index(apps, schema_editor):
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_auto_20261018_1757'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_index, uninstall_index),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_media_files(apps, schema_editor):
+    """Заводит счётчики ссылок для картинок, загруженных до 0015."""
+    MediaFile = apps.get_model('posts', 'MediaFile')
+    Post = apps.get_model('posts', 'Post')
+    images = Post.objects.exclude(image='').order_by().values('image')
+    MediaFile.objects.bulk_create(
+        (MediaFile(name=row['image']) for row in images.distinct().iterator()),
+        ignore_conflicts=True,
+    )
+    MediaFile.objects.update(references=Coalesce(Subquery(
+        Post.objects.filter(image=OuterRef('name')).order_by().values(
+            'image').annotate(total=Count('pk')).values('total')), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_imported_post'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_media_files, migrations.RunPython.noop),
+    ]
@@ -2,17 +2,43 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from .images import EMPTY_METADATA, image_metadata
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 Group = 'Group'
 
 
-class Post(models.Model):
+class CountersModel(models.Model):
+    """
+    Модель с денормализованными счётчиками. При сохранении загруженного
+    объекта счётчики не перезаписываются устаревшими значениями.
+    """
+
+    counter_fields = ()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class Post(CountersModel):
     """Модель для хранения постов."""
 
     text = models.TextField(verbose_name='Текст поста',
                             help_text='Введите текст поста')
     pub_date = models.DateTimeField(auto_now_add=True,
                                     verbose_name='Дата публикации')
+    # Версия разметки поста: входит в ключ кэша его HTML-фрагмента.
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
     author = models.TextField(verbose_name='Автор')
     group = models.ForeignKey(
         Group,
@@ -29,24 +55,67 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки', null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(
+        'Высота картинки', null=True, blank=True, editable=False)
+    image_size = models.PositiveIntegerField(
+        'Размер картинки, байт', null=True, blank=True, editable=False)
+    image_format = models.CharField(
+        'Формат картинки', max_length=10, blank=True, editable=False)
+    image_hash = models.CharField(
+        'SHA-256 картинки', max_length=64, blank=True, editable=False)
+    comments_count = models.PositiveIntegerField(
+        'Комментариев', default=0, editable=False)
+
+    counter_fields = ('comments_count',)
 
     class Meta:
         verbose_name = 'Alex Posting'
         verbose_name_plural = 'Alex Postings'
         ordering = ('-pub_date', )
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        # Метаданные снимаются с загруженного файла до записи в хранилище,
+        # чтобы при выводе не открывать файлы из MEDIA_ROOT.
+        if not self.image:
+            self.set_image_metadata(EMPTY_METADATA)
+        elif not self.image._committed:
+            self.set_image_metadata(image_metadata(self.image.file))
+        super().save(*args, **kwargs)
 
-class Group(models.Model):
+    def set_image_metadata(self, metadata):
+        for field, value in metadata.items():
+            setattr(self, field, value)
+
+
+class Group(CountersModel):
     """Модель для тематических сообществ пользователей."""
 
     title = models.CharField(max_length=200, verbose_name='Title')
     slug = models.SlugField(unique=True, verbose_name='Slug')
     description = models.TextField(verbose_name='Description')
+    posts_count = models.PositiveIntegerField(
+        'Постов', default=0, editable=False)
+
+    counter_fields = ('posts_count',)
 
     class Meta:
         verbose_name = 'Alex Group'
@@ -79,6 +148,11 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ('-created',)
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_idx')
+        ]
 
     def __str__(self) -> str:
         return self.text[:15]
@@ -103,6 +177,125 @@ class Follow(models.Model):
                 fields=['author', 'user'],
                 name='unique_follower')
         ]
+        indexes = [
+            models.Index(
+                fields=['user', 'author'],
+                name='follow_user_author_idx')
+        ]
 
     def __str__(self):
         return f"{self.author}, follower:{self.user}"
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: пост автора у подписчика."""
+    user = models.ForeignKey(
+        User,
+        related_name='timeline',
+        on_delete=models.CASCADE
+    )
+    post = models.ForeignKey(
+        Post,
+        related_name='timeline_entries',
+        on_delete=models.CASCADE
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date', '-post_id')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry')
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx')
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.post_id}'
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, обновляемые при записи."""
+    user = models.OneToOneField(
+        User,
+        related_name='stats',
+        on_delete=models.CASCADE
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Подписчиков', default=0, db_index=True)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self):
+        return f'{self.user}: {self.posts_count}'
+
+
+class MediaFile(models.Model):
+    """
+    Число постов, ссылающихся на файл картинки. Одинаковые загрузки
+    хранятся одним файлом, удалять его можно только без ссылок.
+    """
+    name = models.CharField('Файл', max_length=255, unique=True)
+    references = models.PositiveIntegerField(
+        'Ссылок', default=0, db_index=True)
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self):
+        return f'{self.name}: {self.references}'
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Сколько строк файла записала команда import_content. Обновляется в
+    транзакции пачки, поэтому не расходится с тем, что есть в базе.
+    """
+    source = models.CharField('Источник', max_length=255, unique=True)
+    done = models.PositiveIntegerField('Строк', default=0)
+
+    class Meta:
+        verbose_name = 'Прогресс импорта'
+        verbose_name_plural = 'Прогресс импорта'
+
+    def __str__(self):
+        return f'{self.source}: {self.done}'
+
+
+class ImportedPost(models.Model):
+    """
+    Какой пост создан для id поста из файла импорта. По этой таблице
+    комментарии находят свои посты, в том числе после --resume.
+    """
+    checkpoint = models.ForeignKey(
+        ImportCheckpoint,
+        related_name='posts',
+        on_delete=models.CASCADE
+    )
+    file_id = models.BigIntegerField('id в файле')
+    post = models.ForeignKey(
+        Post,
+        related_name='+',
+        on_delete=models.CASCADE
+    )
+
+    class Meta:
+        verbose_name = 'Импортированный пост'
+        verbose_name_plural = 'Импортированные посты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['checkpoint', 'file_id'],
+                name='unique_imported_post')
+        ]
+
+    def __str__(self):
+        return f'{self.file_id} → {self.post_id}'
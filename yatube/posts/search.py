@@ -0,0 +1,110 @@
+import re
+
+from django.db import connection
+
+from .models import Post
+
+FTS_TABLE = f'{Post._meta.db_table}_fts'
+
+# Внешний контент: индекс хранит только токены, текст берётся из
+# posts_post. Триггеры создаются с IF NOT EXISTS и переустанавливаются
+# после каждой миграции: SQLite пересоздаёт таблицу при изменении
+# схемы и теряет её триггеры.
+SCHEMA = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"text, content='{Post._meta.db_table}', content_rowid='id', "
+    f"tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert "
+    f"AFTER INSERT ON {Post._meta.db_table} BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); "
+    f"END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete "
+    f"AFTER DELETE ON {Post._meta.db_table} BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+    f"VALUES ('delete', old.id, old.text); "
+    f"END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update "
+    f"AFTER UPDATE OF text ON {Post._meta.db_table} BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+    f"VALUES ('delete', old.id, old.text); "
+    f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); "
+    f"END",
+)
+DROP = (
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_update',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+)
+
+
+def is_supported(using=connection):
+    return using.vendor == 'sqlite'
+
+
+def install(using=connection):
+    """Создаёт полнотекстовый индекс и триггеры, если их ещё нет."""
+    if not is_supported(using):
+        return
+    with using.cursor() as cursor:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+
+
+def uninstall(using=connection):
+    if not is_supported(using):
+        return
+    with using.cursor() as cursor:
+        for statement in DROP:
+            cursor.execute(statement)
+
+
+def rebuild(using=connection):
+    """Перестраивает индекс по текущему содержимому posts_post."""
+    if not is_supported(using):
+        return
+    with using.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def match_expression(query):
+    """
+    Превращает пользовательский ввод в запрос FTS5: каждое слово
+    ищется как префикс, все слова обязательны. Операторы FTS5 из
+    ввода не проходят.
+    """
+    words = re.findall(r'\w+', query)
+    return ' '.join('"{}"*'.format(word) for word in words)
+
+
+def filter_posts(queryset, query):
+    """Посты, содержащие все слова запроса, без изменения порядка."""
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    if not is_supported():
+        for word in re.findall(r'\w+', query):
+            queryset = queryset.filter(text__icontains=word)
+        return queryset
+    return queryset.extra(
+        where=[f'{Post._meta.db_table}.id IN (SELECT rowid FROM '
+               f'{FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)'],
+        params=[expression],
+    )
+
+
+def search_posts(queryset, query):
+    """Посты по запросу, отсортированные по релевантности (bm25)."""
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    if not is_supported():
+        return filter_posts(queryset, query)
+    return queryset.extra(
+        select={'rank': f'{FTS_TABLE}.rank'},
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = {Post._meta.db_table}.id',
+               f'{FTS_TABLE} MATCH %s'],
+        params=[expression],
+    ).order_by('rank', '-pk')
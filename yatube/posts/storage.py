@@ -0,0 +1,61 @@
+import hashlib
+import os
+import posixpath
+import re
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CONTENT_PATH_RE = re.compile(
+    r'(^|/)([0-9a-f]{2})/([0-9a-f]{2})/\2\3[0-9a-f]{60}(\.\w+)?$')
+
+
+def content_path(directory, digest, filename):
+    """
+    Путь файла по sha256 содержимого: directory/ab/cd/abcd….ext. Два
+    уровня вложенных каталогов держат число файлов в каждом небольшим.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    return posixpath.join(
+        directory, digest[:2], digest[2:4], digest + extension)
+
+
+def is_content_path(name):
+    return CONTENT_PATH_RE.search(name) is not None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, в котором имя файла — хэш его содержимого внутри каталога
+    из upload_to. Повторная загрузка того же файла не пишет его второй раз.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя выбирает _save по содержимому.
+        return name
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        name = content_path(
+            posixpath.dirname(name), digest.hexdigest(), name)
+        # Переиспользованный файл помечается свежим: иначе сборщик мусора
+        # с --min-age удалил бы его раньше, чем сохранится пост.
+        try:
+            os.utime(self.path(name))
+            return name
+        except FileNotFoundError:
+            pass
+        # Пишем во временный файл и ставим его на место жёсткой ссылкой:
+        # при одновременной загрузке одного содержимого выживет одна копия.
+        temporary = super()._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+        try:
+            os.link(self.path(temporary), self.path(name))
+        except FileExistsError:
+            os.utime(self.path(name))
+        finally:
+            os.remove(self.path(temporary))
+        return name
@@ -0,0 +1,20 @@
+from django import template
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts.caching import post_fragments as cached_fragments
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_fragments(context, posts, template_name='includes/one_post.html'):
+    """Список HTML-фрагментов постов из кэша для вывода в цикле."""
+    group = context.get('group')
+
+    def render(post):
+        return render_to_string(
+            template_name, {'post': post, 'group': group})
+
+    return [mark_safe(fragment) for fragment in cached_fragments(
+        posts, template_name, render, variant='group' if group else '')]
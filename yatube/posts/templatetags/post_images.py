@@ -0,0 +1,13 @@
+from django import template
+
+from posts.thumbnails import picture
+
+register = template.Library()
+
+
+@register.inclusion_tag('includes/post_picture.html')
+def post_picture(post, name='post'):
+    """<picture> с srcset из готовых вариантов миниатюры поста."""
+    return {
+        'picture': picture(post.image, name, post.image_width),
+    }
@@ -0,0 +1,64 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class AdminChangeListTest(TestCase):
+    """Класс тестирования списков объектов в админке."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        cls.author = User.objects.create_user(username='admin_author')
+        cls.group = Group.objects.create(title='group', slug='admin',
+                                         description='description')
+        for i in range(10):
+            post = Post.objects.create(author=cls.author, text=f'{i}',
+                                       group=cls.group)
+            Comment.objects.create(post=post, author=cls.admin, text=f'{i}')
+        Follow.objects.create(user=cls.admin, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def test_changelists_do_not_query_per_row(self):
+        """Число запросов не зависит от числа строк."""
+        for model in ('post', 'comment', 'follow'):
+            url = reverse(f'admin:posts_{model}_changelist')
+            with self.subTest(model=model):
+                self.client.get(url)
+                Post.objects.create(author=self.author, text='more',
+                                    group=self.group)
+                with CaptureQueriesContext(connection) as first:
+                    self.client.get(url)
+                Comment.objects.create(post=Post.objects.first(),
+                                       author=self.admin, text='more')
+                with CaptureQueriesContext(connection) as second:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(second), len(first))
+
+    def test_date_hierarchy_is_cached(self):
+        """Даты для date_hierarchy берутся из кэша до изменения постов."""
+        url = reverse('admin:posts_post_changelist')
+        with CaptureQueriesContext(connection) as cold:
+            self.client.get(url)
+        with CaptureQueriesContext(connection) as warm:
+            self.client.get(url)
+        self.assertLess(len(warm), len(cold))
+        Post.objects.create(author=self.author, text='new')
+        with CaptureQueriesContext(connection) as changed:
+            self.client.get(url)
+        self.assertEqual(len(changed), len(cold))
+
+    def test_list_editable_group_uses_autocomplete(self):
+        """Группа в списке постов выбирается автодополнением."""
+        response = self.client.get(reverse('admin:posts_post_changelist'))
+        self.assertContains(response, 'admin-autocomplete')
@@ -0,0 +1,149 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from core.middleware import (QueryBudgetExceeded, RequestMetricsMiddleware,
+                             query_budget)
+from posts.management.commands.benchmark_views import Command
+from posts.models import Comment, Follow, Group, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+
+
+@override_settings(QUERY_BUDGET_MODE='fail', MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class QueryBudgetTest(TestCase):
+    """Класс тестирования бюджетов SQL-запросов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='budget_author')
+        cls.reader = User.objects.create_user(username='budget_reader')
+        cls.group = Group.objects.create(title='group', slug='budget',
+                                         description='description')
+        for i in range(15):
+            cls.post = Post.objects.create(author=cls.author, text=f'{i}',
+                                           group=cls.group)
+            Comment.objects.create(post=cls.post, author=cls.reader,
+                                   text=f'{i}')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+
+    def test_views_stay_within_budget(self):
+        """Страницы укладываются в объявленный бюджет запросов."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:search') + '?q=1',
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            reverse('posts:post_comments',
+                    kwargs={'post_id': self.post.id}),
+            reverse('posts:follow_index'),
+            reverse('posts:post_create'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('db;dur=', response['Server-Timing'])
+
+    def test_writes_stay_within_budget(self):
+        """Изменяющие запросы укладываются в бюджет."""
+        self.client.post(reverse('posts:post_create'),
+                         {'text': 'text', 'group': self.group.id})
+        image = SimpleUploadedFile('small.gif', SMALL_GIF,
+                                   content_type='image/gif')
+        response = self.client.post(reverse('posts:post_create'),
+                                    {'text': 'image', 'image': image})
+        self.assertEqual(response.status_code, 302)
+        post = Post.objects.get(text='image')
+        image = SimpleUploadedFile('other.gif', SMALL_GIF + b'\0',
+                                   content_type='image/gif')
+        self.client.force_login(self.reader)
+        self.client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.id}),
+            {'text': 'edited', 'image': image})
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            {'text': 'comment'})
+        username = {'username': self.author.username}
+        self.client.get(reverse('posts:profile_unfollow', kwargs=username))
+        self.client.get(reverse('posts:profile_follow', kwargs=username))
+
+    def test_exceeded_budget_fails(self):
+        """Превышение бюджета в режиме fail выбрасывает исключение."""
+        @query_budget(0)
+        def view(request):
+            list(User.objects.all())
+            return HttpResponse()
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        middleware = RequestMetricsMiddleware(get_response)
+        request = RequestFactory().get('/')
+        request.resolver_match = None
+        with self.assertRaises(QueryBudgetExceeded):
+            middleware(request)
+
+
+class BenchmarkCompareTest(TestCase):
+    """Класс тестирования сравнения бенчмарка с эталоном."""
+
+    def test_compare_reports_regressions(self):
+        """Рост числа запросов и p95 сверх допуска считается регрессией."""
+        baseline = {'index': {'queries': 2}}
+        timings = {'index': {'queries': 2, 'p95_ms': 10.0}}
+        compare = Command().compare
+        self.assertEqual(compare(
+            {'index': {'queries': 2, 'p95_ms': 16.0}}, baseline, timings,
+            0.5, 1), [])
+        self.assertEqual(len(compare(
+            {'index': {'queries': 3, 'p95_ms': 17.0}}, baseline, timings,
+            0.5, 1)), 2)
+
+    def test_timings_are_compared_only_on_request(self):
+        """Без отчёта прошлого прогона задержки не сравниваются."""
+        self.assertEqual(Command().compare(
+            {'index': {'queries': 2, 'p95_ms': 500.0}},
+            {'index': {'queries': 2}}), [])
+
+
+class ExplainViewsTest(TestCase):
+    """Класс тестирования планов запросов страниц."""
+
+    def test_pages_use_indexes(self):
+        """Запросы страниц не просматривают таблицы целиком."""
+        author = User.objects.create_user(username='explain_author')
+        reader = User.objects.create_user(username='explain_reader')
+        group = Group.objects.create(title='group', slug='explain',
+                                     description='description')
+        for i in range(15):
+            post = Post.objects.create(author=author, text=f'{i}',
+                                       group=group)
+            Comment.objects.create(post=post, author=reader, text=f'{i}')
+        Follow.objects.create(user=reader, author=author)
+        call_command('explain_views', stdout=StringIO())
@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from core.cache import Entry, SQLiteCache, TieredCache
+
+TEMP_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SHARED = {
+    'BACKEND': 'core.cache.SQLiteCache',
+    'LOCATION': os.path.join(TEMP_DIR, 'cache.sqlite3'),
+}
+
+
+def tiered(location, **options):
+    return TieredCache(location, {
+        'OPTIONS': {'SHARED': SHARED, 'WAIT_TIMEOUT': 2, **options}})
+
+
+class TieredCacheTest(SimpleTestCase):
+    """Класс тестирования двухуровневого кэша."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def setUp(self):
+        self.cache = tiered('first')
+        self.cache.clear()
+
+    def test_sqlite_backend_operations(self):
+        """SQLite-хранилище поддерживает операции кэша Django."""
+        shared = SQLiteCache(SHARED['LOCATION'], {})
+        self.assertTrue(shared.add('counter', 1))
+        self.assertFalse(shared.add('counter', 5))
+        self.assertEqual(shared.incr('counter', 2), 3)
+        shared.set_many({'a': 'x', 'b': ['y']})
+        self.assertEqual(shared.get_many(['a', 'b', 'c']),
+                         {'a': 'x', 'b': ['y']})
+        shared.set('old', 1, timeout=-1)
+        self.assertIsNone(shared.get('old'))
+        self.assertTrue(shared.add('old', 2))
+        with self.assertRaises(ValueError):
+            shared.incr('missing')
+
+    def test_local_tier_is_bounded_and_shared_tier_is_common(self):
+        """Процессный LRU ограничен, общий уровень видят все."""
+        small = tiered('small', LOCAL_MAX_ENTRIES=2)
+        for key in 'abc':
+            small.set(key, key)
+        self.assertEqual(len(small.local.entries), 2)
+        self.assertEqual(small.get('a'), 'a')
+        self.assertEqual(tiered('other').get('c'), 'c')
+
+    def test_generations_are_not_kept_in_process(self):
+        """Изменение поколения ленты сразу видят все процессы."""
+        first, second = tiered('first'), tiered('second')
+        first.add('feed_generation:index', 100, None)
+        self.assertEqual(second.get('feed_generation:index'), 100)
+        self.assertEqual(first.incr('feed_generation:index'), 101)
+        self.assertEqual(second.get('feed_generation:index'), 101)
+        second.set('template.cache.page', 'html')
+        self.assertIn(second._key('template.cache.page', None),
+                      second.local.entries)
+
+    def test_concurrent_miss_is_computed_once(self):
+        """Промах по горячему ключу пересчитывает один поток."""
+        key = 'template.cache.index_page.hash'
+        self.assertIsNone(self.cache.get(key))
+        result = []
+        waiter = threading.Thread(
+            target=lambda: result.append(tiered('first').get(key)))
+        waiter.start()
+        time.sleep(0.2)
+        self.cache.set(key, 'page')
+        waiter.join()
+        self.assertEqual(result, ['page'])
+        stats = self.cache.stats()['template.cache.index_page']
+        self.assertEqual(stats['waits'], 1)
+
+    def test_expiring_value_is_recomputed_early_once(self):
+        """Перед истечением значение пересчитывает один читатель."""
+        self.cache.shared.set(
+            'feed', Entry('page', time.time() + 1, delta=60))
+        self.assertIsNone(self.cache.get('feed'))
+        self.assertEqual(tiered('second').get('feed'), 'page')
+        self.cache.set('feed', 'new page')
+        self.assertEqual(self.cache.get('feed'), 'new page')
+        self.assertEqual(self.cache.stats()['feed']['recomputes'], 1)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'core.cache.TieredCache', 'LOCATION': 'first',
+        'OPTIONS': {'SHARED': SHARED}}})
+    def test_cache_stats_command(self):
+        """Команда выводит долю попаданий по группам ключей."""
+        self.cache.set('feed_generation:index', 1)
+        self.cache.get('feed_generation:index')
+        self.cache.get('feed_generation:group')
+        self.cache.flush_stats()
+        out = StringIO()
+        call_command('cache_stats', stdout=out)
+        self.assertIn('feed_generation', out.getvalue())
+        self.assertIn('50.0%', out.getvalue())
@@ -0,0 +1,95 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class ConditionalGetTest(TestCase):
+    """Класс тестирования ответов 304 для лент и страницы поста."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='etag_author')
+        cls.reader = User.objects.create_user(username='etag_reader')
+        cls.group = Group.objects.create(title='group', slug='etag',
+                                         description='description')
+        cls.post = Post.objects.create(author=cls.author, text='text',
+                                       group=cls.group)
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': cls.author.username}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.id}),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_pages_are_not_rendered(self):
+        """Повторный запрос неизменной страницы получает 304."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                response = self.revalidate(url, etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+
+    def test_changes_produce_new_etag(self):
+        """Новый комментарий меняет ETag всех страниц с постом."""
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='comment')
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                self.assertEqual(self.revalidate(url, etag).status_code, 200)
+
+    def test_etag_depends_on_user_and_follow(self):
+        """ETag учитывает пользователя и его подписку на автора."""
+        url = self.urls[2]
+        etag = self.client.get(url)['ETag']
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.revalidate(url, etag).status_code, 200)
+        self.client.logout()
+        self.assertEqual(
+            self.revalidate(self.urls[0], etag).status_code, 200)
+
+    def test_relogin_gets_fresh_csrf_token(self):
+        """После повторного входа страница поста приходит с новым токеном."""
+        client = Client(enforce_csrf_checks=True)
+        login_url = reverse('users:login')
+
+        def login():
+            token = client.get(login_url).context['csrf_token']
+            client.post(login_url, {'username': self.reader.username,
+                                    'password': 'password',
+                                    'csrfmiddlewaretoken': token})
+
+        self.reader.set_password('password')
+        self.reader.save()
+        login()
+        url = self.urls[3]
+        etag = client.get(url)['ETag']
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+                         304)
+        client.logout()
+        login()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        comment = client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            {'text': 'comment',
+             'csrfmiddlewaretoken': response.context['csrf_token']})
+        self.assertEqual(comment.status_code, 302)
+
+    def test_missing_objects_still_404(self):
+        """Для несуществующих объектов валидатор не мешает 404."""
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'nobody'}))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,114 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+
+
+class CountersTest(TestCase):
+    """Класс тестирования денормализованных счётчиков."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='count_author')
+        cls.reader = User.objects.create_user(username='count_reader')
+        cls.group = Group.objects.create(title='group', slug='count_group',
+                                         description='description')
+        cls.other_group = Group.objects.create(
+            title='other', slug='count_other', description='description')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_post_counters(self):
+        """Создание, перенос и удаление поста меняют счётчики."""
+        post = Post.objects.create(author=self.author, text='text',
+                                   group=self.group)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        post.group = self.other_group
+        post.save()
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 1)
+        post.delete()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 0)
+
+    def test_comment_and_follow_counters(self):
+        """Комментарии и подписки меняют счётчики."""
+        post = Post.objects.create(author=self.author, text='text')
+        comment = Comment.objects.create(post=post, author=self.reader,
+                                         text='comment')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        Follow.objects.filter(user=self.reader).delete()
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+
+    def test_save_does_not_overwrite_counters(self):
+        """Сохранение устаревшего объекта не затирает счётчик."""
+        post = Post.objects.create(author=self.author, text='text')
+        Comment.objects.create(post=post, author=self.reader, text='comment')
+        post.text = 'edited'
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+    def test_recount_repairs_drift(self):
+        """Команда recount исправляет расхождения."""
+        post = Post.objects.create(author=self.author, text='text',
+                                   group=self.group)
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.filter(pk=post.pk).update(comments_count=7)
+        Group.objects.update(posts_count=0)
+        UserStats.objects.all().delete()
+        call_command('recount', stdout=StringIO())
+        post.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+
+    def test_drifted_counters_do_not_break_deletes(self):
+        """Удаление при разошедшихся счётчиках не падает на CHECK >= 0."""
+        User.objects.bulk_create([User(username='count_raw')])
+        user = User.objects.get(username='count_raw')
+        Post.objects.bulk_create([Post(author=user, text='text')])
+        Follow.objects.create(user=self.reader, author=user)
+        self.assertEqual(self.stats(user).posts_count, 1)
+        self.assertEqual(self.stats(user).followers_count, 1)
+        UserStats.objects.filter(user=user).update(posts_count=0)
+        Post.objects.filter(author=user).delete()
+        self.assertEqual(self.stats(user).posts_count, 0)
+        user_id = user.pk
+        user.delete()
+        self.assertFalse(UserStats.objects.filter(user_id=user_id).exists())
+
+    def test_pages_do_not_aggregate(self):
+        """Страницы поста и профиля не считают записи COUNT(*)."""
+        post = Post.objects.create(author=self.author, text='text')
+        for url in (
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}),
+        ):
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(url)
+                self.assertFalse(any(
+                    'COUNT(' in query['sql'] for query in queries))
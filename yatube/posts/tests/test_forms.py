@@ -1,3 +1,4 @@
+import hashlib
 import shutil
 import tempfile
 from http import HTTPStatus
@@ -9,6 +10,7 @@ from django.urls import reverse
 
 from posts.forms import PostForm
 from posts.models import Comment, Follow, Group, Post, User
+from posts.storage import content_path
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -86,7 +88,8 @@ class PostCreateFormTest(TestCase):
         self.assertEqual(last_post.text, form['text'])
         self.assertEqual(last_post.group.pk, form['group'])
         self.assertEqual(last_post.author, self.author)
-        self.assertEqual(last_post.image.name, 'posts/small.gif')
+        self.assertEqual(last_post.image.name, content_path(
+            'posts', hashlib.sha256(self.small_gif).hexdigest(), 'small.gif'))
 
     def test_eddit_post_success(self):
         """Проверка редактирования поста."""
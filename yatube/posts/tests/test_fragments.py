@@ -0,0 +1,53 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.caching import post_fragments
+from posts.models import Comment, Post, User
+
+
+class PostFragmentCacheTest(TestCase):
+    """Класс тестирования кэша HTML-фрагментов постов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='fragments')
+        for i in range(3):
+            Post.objects.create(author=cls.author, text=f'post {i}')
+
+    def setUp(self):
+        cache.clear()
+        self.rendered = []
+
+    def render(self, post):
+        self.rendered.append(post.pk)
+        return f'<p>{post.text}</p>'
+
+    def fragments(self):
+        return post_fragments(Post.objects.order_by('pk'), 'test',
+                              self.render)
+
+    def test_only_changed_post_is_rendered_again(self):
+        """Правка поста и новый комментарий перерисовывают только его."""
+        first, second, third = Post.objects.order_by('pk')
+        self.fragments()
+        self.assertEqual(self.rendered, [first.pk, second.pk, third.pk])
+        self.rendered.clear()
+        self.assertEqual(self.fragments(), [
+            '<p>post 0</p>', '<p>post 1</p>', '<p>post 2</p>'])
+        self.assertEqual(self.rendered, [])
+        second.text = 'edited'
+        second.save()
+        Comment.objects.create(post=third, author=self.author, text='c')
+        self.assertEqual(self.fragments()[1], '<p>edited</p>')
+        self.assertEqual(self.rendered, [second.pk, third.pk])
+
+    def test_feed_shows_edited_post(self):
+        """Лента выводит отредактированный пост."""
+        self.client.get(reverse('posts:index'))
+        post = Post.objects.earliest('pk')
+        post.text = 'edited text'
+        post.save()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'edited text')
@@ -0,0 +1,137 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TransactionTestCase
+
+from posts.management.commands.import_content import Command
+from posts.models import (Comment, Follow, Group, ImportCheckpoint, Post,
+                          TimelineEntry, User)
+from posts.search import search_posts
+
+TEMP_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+RECORDS = [
+    {'type': 'group', 'slug': 'imported', 'title': 'Imported'},
+    {'type': 'user', 'username': 'writer', 'first_name': 'Writer'},
+    {'type': 'post', 'id': 1000, 'author': 'writer', 'group': 'imported',
+     'text': 'imported sunrise', 'pub_date': '2020-01-02T03:04:05'},
+    {'type': 'post', 'id': 1001, 'author': 'writer',
+     'text': 'second post', 'pub_date': '2020-01-03T03:04:05'},
+    {'type': 'comment', 'post': 1000, 'author': 'reader', 'text': 'nice',
+     'created': '2020-01-04T00:00:00'},
+    {'type': 'follow', 'user': 'reader', 'author': 'writer'},
+]
+
+
+class ImportContentTest(TransactionTestCase):
+    """Класс тестирования массового импорта контента."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def write(self, records, name='content.jsonl'):
+        path = os.path.join(TEMP_DIR, name)
+        with open(path, 'w') as file:
+            for record in records:
+                file.write(json.dumps(record) + '\n')
+        return path
+
+    def test_import_creates_content_and_derived_data(self):
+        """Импорт создаёт записи, счётчики, ленты и поисковый индекс."""
+        call_command('import_content', self.write(RECORDS),
+                     defer_indexes=True, stdout=StringIO())
+        post = Post.objects.get(text='imported sunrise')
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(post.group, Group.objects.get(slug='imported'))
+        self.assertEqual(post.comments_count, 1)
+        writer = User.objects.get(username='writer')
+        self.assertEqual(writer.first_name, 'Writer')
+        self.assertEqual(writer.stats.posts_count, 2)
+        self.assertEqual(writer.stats.followers_count, 1)
+        reader = User.objects.get(username='reader')
+        self.assertFalse(reader.has_usable_password())
+        self.assertTrue(Follow.objects.filter(user=reader).exists())
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=reader).count(), 2)
+        self.assertEqual(Comment.objects.get().created.day, 4)
+        self.assertEqual(
+            list(search_posts(Post.objects.all(), 'sunrise')), [post])
+
+    def test_import_resumes_from_checkpoint(self):
+        """Прерванный импорт продолжается без дублей."""
+        broken = RECORDS[:4] + [{'type': 'unknown'}] + RECORDS[4:]
+        path = self.write(broken)
+        with self.assertRaises(CommandError):
+            call_command('import_content', path, batch_size=2,
+                         stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(ImportCheckpoint.objects.get().done, 4)
+        self.write(RECORDS[:4] + [{'type': 'group', 'slug': 'extra',
+                                   'title': 'Extra'}] + RECORDS[4:])
+        call_command('import_content', path, batch_size=2, resume=True,
+                     stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertTrue(Group.objects.filter(slug='extra').exists())
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+    def test_file_ids_do_not_collide_with_existing_posts(self):
+        """id из файла не перезаписывают и не занимают посты сайта."""
+        owner = User.objects.create_user(username='owner')
+        existing = Post.objects.create(author=owner, text='existing')
+        path = self.write([
+            {'type': 'post', 'id': existing.pk, 'author': 'writer',
+             'text': 'imported'},
+            {'type': 'comment', 'post': existing.pk, 'author': 'reader',
+             'text': 'imported comment'},
+        ])
+        out = StringIO()
+        call_command('import_content', path, stdout=out)
+        imported = Post.objects.get(text='imported')
+        self.assertNotEqual(imported.pk, existing.pk)
+        self.assertEqual(Comment.objects.get().post, imported)
+        self.assertFalse(existing.comments.exists())
+        self.assertIn('post: 1', out.getvalue())
+
+    def test_comment_to_unknown_post_fails(self):
+        """Комментарий к посту, которого нет в файле, — ошибка."""
+        path = self.write([
+            {'type': 'comment', 'post': 5, 'author': 'reader', 'text': 'x'},
+        ])
+        with self.assertRaises(CommandError):
+            call_command('import_content', path, stdout=StringIO())
+        self.assertFalse(Comment.objects.exists())
+
+    def test_crash_before_checkpoint_does_not_duplicate(self):
+        """Пачка без отметки откатывается, комментарии не дублируются."""
+        records = RECORDS + [
+            {'type': 'post', 'author': 'writer', 'text': 'no id'},
+            {'type': 'comment', 'post': 1001, 'author': 'reader',
+             'text': 'no id'},
+        ]
+        path = self.write(records)
+        write_checkpoint = Command.write_checkpoint
+
+        def crash_on_last_batch(command, done):
+            if done == len(records):
+                raise RuntimeError('crash')
+            write_checkpoint(command, done)
+
+        with mock.patch.object(Command, 'write_checkpoint',
+                               crash_on_last_batch):
+            with self.assertRaises(RuntimeError):
+                call_command('import_content', path, batch_size=2,
+                             stdout=StringIO())
+        self.assertEqual(ImportCheckpoint.objects.get().done, 6)
+        call_command('import_content', path, batch_size=2, resume=True,
+                     stdout=StringIO())
+        self.assertEqual(Post.objects.filter(text='no id').count(), 1)
+        self.assertEqual(Comment.objects.filter(text='no id').count(), 1)
@@ -0,0 +1,165 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from sorl.thumbnail import get_thumbnail
+
+from posts.models import MediaFile, Post, User
+from posts.storage import content_path
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+OTHER_GIF = SMALL_GIF.replace(b'\x4c\x01', b'\x44\x01')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedMediaTest(TestCase):
+    """Класс тестирования хранилища картинок по хэшу содержимого."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='media')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, content=SMALL_GIF, name='small.gif'):
+        return Post.objects.create(
+            author=self.user, text='image',
+            image=SimpleUploadedFile(name, content, 'image/gif'))
+
+    def references(self, name):
+        return MediaFile.objects.get(name=name).references
+
+    def test_identical_uploads_share_one_file(self):
+        """Одинаковые картинки хранятся одним файлом по хэшу."""
+        first = self.create_post()
+        second = self.create_post(name='copy.GIF')
+        digest = hashlib.sha256(SMALL_GIF).hexdigest()
+        self.assertEqual(first.image.name,
+                         f'posts/{digest[:2]}/{digest[2:4]}/{digest}.gif')
+        self.assertEqual(second.image.name, first.image.name)
+        directory = os.path.dirname(first.image.path)
+        self.assertEqual(os.listdir(directory), [f'{digest}.gif'])
+        self.assertEqual(self.references(first.image.name), 2)
+        second.delete()
+        self.assertEqual(self.references(first.image.name), 1)
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp(dir=TEMP_MEDIA_ROOT))
+    def test_reused_file_is_protected_from_collector(self):
+        """Повторная загрузка старого файла защищает его от сборщика."""
+        post = self.create_post()
+        storage = post.image.storage
+        old = time.time() - 2 * 60 * 60
+        os.utime(post.image.path, (old, old))
+        post.delete()
+        # Пост с новой загрузкой ещё не сохранён.
+        name = storage.save('posts/again.gif', SimpleUploadedFile(
+            'again.gif', SMALL_GIF, 'image/gif'))
+        self.assertEqual(name, post.image.name)
+        call_command('collect_media_garbage', min_age=60, rate=0,
+                     stdout=StringIO())
+        self.assertTrue(storage.exists(name))
+
+    def test_changing_image_moves_reference(self):
+        """Замена картинки переносит ссылку на новый файл."""
+        post = self.create_post()
+        old_name = post.image.name
+        post.image = SimpleUploadedFile('other.gif', OTHER_GIF, 'image/gif')
+        post.save()
+        self.assertEqual(self.references(old_name), 0)
+        self.assertEqual(self.references(post.image.name), 1)
+
+    def test_migrate_media_command(self):
+        """Команда переносит старые файлы в новое хранилище."""
+        post = self.create_post()
+        storage = post.image.storage
+        legacy = 'posts/legacy.gif'
+        with open(os.path.join(TEMP_MEDIA_ROOT, legacy), 'wb') as file:
+            file.write(SMALL_GIF)
+        Post.objects.filter(pk=post.pk).update(image=legacy, image_hash='')
+        call_command('migrate_media', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.image.name, content_path(
+            'posts', hashlib.sha256(SMALL_GIF).hexdigest(), legacy))
+        self.assertFalse(storage.exists(legacy))
+        self.assertEqual(self.references(post.image.name), 1)
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp(dir=TEMP_MEDIA_ROOT))
+    def test_collect_media_garbage_command(self):
+        """Сборщик удаляет осиротевшие картинки и лишние миниатюры."""
+        post = self.create_post()
+        thumbnail = get_thumbnail(post.image, '10x10')
+        orphan = 'posts/orphan.gif'
+        stale = 'cache/00/00/stale.jpg'
+        for name in (orphan, stale):
+            path = os.path.join(settings.MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(OTHER_GIF)
+        storage = post.image.storage
+        call_command('collect_media_garbage', dry_run=True, min_age=-60,
+                     stdout=StringIO())
+        self.assertTrue(storage.exists(orphan))
+        self.assertTrue(storage.exists(stale))
+        out = StringIO()
+        call_command('collect_media_garbage', min_age=-60, rate=0,
+                     stdout=out)
+        self.assertIn('картинок 1, миниатюр 1', out.getvalue())
+        self.assertFalse(storage.exists(orphan))
+        self.assertFalse(storage.exists(stale))
+        self.assertTrue(storage.exists(post.image.name))
+        self.assertTrue(storage.exists(thumbnail.name))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(dir=TEMP_MEDIA_ROOT))
+class UnreferencedMediaTest(TransactionTestCase):
+    """Класс тестирования удаления картинок без ссылок."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='media_release')
+
+    def create_post(self):
+        return Post.objects.create(
+            author=self.user, text='image',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'))
+
+    def test_last_reference_deletes_file(self):
+        """Файл удаляется вместе с последним ссылающимся постом."""
+        first, second = self.create_post(), self.create_post()
+        storage = first.image.storage
+        old = time.time() - settings.MEDIA_MIN_AGE - 1
+        os.utime(first.image.path, (old, old))
+        first.delete()
+        self.assertTrue(storage.exists(second.image.name))
+        second.delete()
+        self.assertFalse(storage.exists(second.image.name))
+        self.assertFalse(MediaFile.objects.exists())
+
+    def test_recent_file_is_left_to_collector(self):
+        """Свежий файл без ссылок остаётся сборщику мусора."""
+        post = self.create_post()
+        post.delete()
+        self.assertTrue(post.image.storage.exists(post.image.name))
+        self.assertFalse(MediaFile.objects.exists())
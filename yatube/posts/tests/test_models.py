@@ -1,8 +1,24 @@
-from django.test import TestCase
+import hashlib
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 
 from posts.models import Group, Post, User
 
 LIMIT_SIMBOLS = 15
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
 
 
 class PostModelTest(TestCase):
@@ -56,3 +72,49 @@ class PostModelTest(TestCase):
             with self.subTest(value=value):
                 self.assertEqual(
                     post._meta.get_field(value).help_text, expected)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PostImageMetadataTest(TestCase):
+    """Класс тестирования метаданных картинки поста."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='metadata')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self):
+        return Post.objects.create(
+            author=self.user, text='image',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'))
+
+    def test_metadata_is_stored_on_upload(self):
+        """Размеры, формат, объём и хэш сохраняются при загрузке."""
+        post = Post.objects.get(pk=self.create_post().pk)
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(post.image_size, len(SMALL_GIF))
+        self.assertEqual(post.image_format, 'GIF')
+        self.assertEqual(post.image_hash,
+                         hashlib.sha256(SMALL_GIF).hexdigest())
+        post.image = None
+        post.save()
+        post.refresh_from_db()
+        self.assertIsNone(post.image_width)
+        self.assertEqual(post.image_hash, '')
+
+    def test_fill_image_metadata_command(self):
+        """Команда заполняет метаданные старых картинок."""
+        post = self.create_post()
+        Post.objects.filter(pk=post.pk).update(
+            image_width=None, image_height=None, image_size=None,
+            image_format='', image_hash='')
+        call_command('fill_image_metadata', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.image_width, 2)
+        self.assertEqual(post.image_hash,
+                         hashlib.sha256(SMALL_GIF).hexdigest())
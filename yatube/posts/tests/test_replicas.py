@@ -0,0 +1,85 @@
+import time
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.routers import ReplicaRouter, mark_synced, route_reads, wrote
+from posts.models import Post, User
+
+
+@override_settings(DATABASE_REPLICAS=['default'])
+class ReplicaRoutingTest(TestCase):
+    """Класс тестирования чтения лент из реплик."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='replica')
+
+    def setUp(self):
+        cache.clear()
+        mark_synced('default', time.time())
+        self.client.force_login(self.user)
+
+    def route(self, response):
+        return response.wsgi_request.db_route
+
+    def test_router_sends_reads_to_chosen_alias(self):
+        """Чтения идут в выбранную базу, записи — в default."""
+        router = ReplicaRouter()
+        route_reads('replica')
+        try:
+            self.assertEqual(router.db_for_read(Post), 'replica')
+            self.assertIsNone(router.db_for_read(User))
+            self.assertIsNone(router.db_for_read(Session))
+            self.assertFalse(wrote())
+            self.assertEqual(router.db_for_write(Post), 'default')
+            self.assertTrue(wrote())
+        finally:
+            route_reads(None)
+        self.assertIsNone(router.db_for_read(Post))
+
+    def test_feeds_read_from_replica_until_own_write(self):
+        """После своей записи пользователь читает ленты из default."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(self.route(response), 'default:replica')
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        response = self.client.post(reverse('posts:post_create'),
+                                    {'text': 'my post'})
+        pin = response.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertEqual(pin['max-age'], settings.REPLICA_LAG_TOLERANCE)
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(self.route(response), 'default:pinned')
+        self.assertContains(response, 'my post')
+
+    def test_other_views_use_default(self):
+        """Страницы вне REPLICA_VIEWS не трогают реплики."""
+        response = self.client.get(reverse('posts:post_create'))
+        self.assertIsNone(self.route(response))
+
+    def test_lagging_replica_is_not_used(self):
+        """Реплика, отставшая больше допустимого, не читается."""
+        mark_synced('default',
+                    time.time() - settings.REPLICA_LAG_TOLERANCE - 10)
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(self.route(response), 'default:lagging')
+        self.assertGreater(response.wsgi_request.replica_lag,
+                           settings.REPLICA_LAG_TOLERANCE)
+        cache.clear()
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(self.route(response), 'default:lagging')
+        self.assertIsNone(response.wsgi_request.replica_lag)
+
+    def test_replica_older_than_feed_change_is_not_cached(self):
+        """Ленту, изменённую после копии реплики, читает default."""
+        mark_synced('default', time.time() - 1)
+        Post.objects.create(author=self.user, text='fresh post')
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(self.route(response), 'default:stale')
+        self.assertContains(response, 'fresh post')
+        mark_synced('default', time.time())
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(self.route(response), 'default:replica')
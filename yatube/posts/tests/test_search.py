@@ -0,0 +1,68 @@
+from io import StringIO
+
+from django.contrib.admin.sites import site
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+from posts.models import Post, User
+from posts.search import match_expression, search_posts
+
+
+class SearchTest(TestCase):
+    """Класс тестирования полнотекстового поиска."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='searcher')
+        cls.both = Post.objects.create(
+            author=cls.user, text='Котики и собаки дружат')
+        cls.cats = Post.objects.create(
+            author=cls.user, text='Котики, котики и ещё раз котики')
+        cls.other = Post.objects.create(author=cls.user, text='Про погоду')
+
+    def test_match_expression_strips_operators(self):
+        """Операторы FTS5 из ввода превращаются в обычные слова."""
+        self.assertEqual(match_expression('кот OR "dog" -x*'),
+                         '"кот"* "OR"* "dog"* "x"*')
+        self.assertEqual(match_expression('  "*" '), '')
+
+    def test_search_requires_all_words(self):
+        """Находятся посты со всеми словами запроса, по префиксу."""
+        found = search_posts(Post.objects.all(), 'кот соба')
+        self.assertEqual(list(found), [self.both])
+
+    def test_index_follows_edits_and_deletes(self):
+        """Индекс обновляется при изменении и удалении поста."""
+        post = Post.objects.get(pk=self.other.pk)
+        post.text = 'Про котиков'
+        post.save()
+        found = search_posts(Post.objects.all(), 'котиков')
+        self.assertEqual(list(found), [post])
+        post.delete()
+        self.assertFalse(search_posts(Post.objects.all(), 'котиков'))
+        self.assertFalse(search_posts(Post.objects.all(), 'погоду'))
+
+    def test_search_page(self):
+        """Страница поиска выводит посты по релевантности."""
+        response = self.client.get(reverse('posts:search'), {'q': 'котики'})
+        self.assertTemplateUsed(response, 'posts/search.html')
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.cats, self.both])
+        response = self.client.get(reverse('posts:search'))
+        self.assertFalse(response.context['page_obj'])
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт через индекс."""
+        request = RequestFactory().get('/')
+        queryset, distinct = site._registry[Post].get_search_results(
+            request, Post.objects.all(), 'погод')
+        self.assertEqual(list(queryset), [self.other])
+        self.assertFalse(distinct)
+
+    def test_rebuild_search_index_command(self):
+        """Команда пересобирает индекс."""
+        call_command('rebuild_search_index', stdout=StringIO())
+        found = search_posts(Post.objects.all(), 'погоду')
+        self.assertEqual(list(found), [self.other])
@@ -0,0 +1,94 @@
+import gzip
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+TEMP_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+MEDIA_ROOT = os.path.join(TEMP_ROOT, 'media')
+STATIC_ROOT = os.path.join(TEMP_ROOT, 'static')
+SOURCE_DIR = os.path.join(TEMP_ROOT, 'source')
+DIGEST = 'ab' * 32
+CONTENT_NAME = f'posts/ab/ab/{DIGEST}.gif'
+CSS = b'body { color: red; }\n' * 100
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, STATIC_ROOT=STATIC_ROOT,
+                   STATICFILES_DIRS=(SOURCE_DIR,), SENDFILE_HEADER=None)
+class FileServingTest(TestCase):
+    """Класс тестирования отдачи статики и медиа."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for root, name, content in (
+                (MEDIA_ROOT, CONTENT_NAME, b'0123456789'),
+                (MEDIA_ROOT, 'posts/legacy.gif', b'legacy'),
+                (SOURCE_DIR, 'css/app.css', CSS)):
+            path = os.path.join(root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(content)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_ROOT, ignore_errors=True)
+
+    def test_content_addressed_media_is_immutable(self):
+        """Картинки с хэшем в имени кэшируются навсегда, ETag работает."""
+        response = self.client.get(f'/media/{CONTENT_NAME}')
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Content-Type'], 'image/gif')
+        repeat = self.client.get(f'/media/{CONTENT_NAME}',
+                                 HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+        legacy = self.client.get('/media/posts/legacy.gif')
+        self.assertNotIn('immutable', legacy['Cache-Control'])
+
+    def test_range_requests(self):
+        """Запрос с Range получает только нужные байты."""
+        response = self.client.get(f'/media/{CONTENT_NAME}',
+                                   HTTP_RANGE='bytes=2-4')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'234')
+        self.assertEqual(response['Content-Range'], 'bytes 2-4/10')
+        suffix = self.client.get(f'/media/{CONTENT_NAME}',
+                                 HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(suffix.streaming_content), b'789')
+        outside = self.client.get(f'/media/{CONTENT_NAME}',
+                                  HTTP_RANGE='bytes=20-')
+        self.assertEqual(outside.status_code, 416)
+
+    def test_path_outside_root_is_not_served(self):
+        """Файлы вне MEDIA_ROOT не отдаются."""
+        response = self.client.get('/media/../source/css/app.css')
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(SENDFILE_HEADER='X-Accel-Redirect')
+    def test_sendfile_offload(self):
+        """С X-Accel-Redirect тело файла отдаёт веб-сервер."""
+        response = self.client.get(f'/media/{CONTENT_NAME}')
+        self.assertEqual(response['X-Accel-Redirect'],
+                         f'/internal/media/{CONTENT_NAME}')
+        self.assertEqual(response.content, b'')
+
+    @override_settings(
+        STATICFILES_STORAGE='core.storage.'
+                            'CompressedManifestStaticFilesStorage')
+    def test_collected_static_is_hashed_and_precompressed(self):
+        """collectstatic пишет хэшированные имена и сжатые копии."""
+        call_command('collectstatic', interactive=False, verbosity=0)
+        hashed = next(name for name in os.listdir(
+            os.path.join(STATIC_ROOT, 'css')) if name.count('.') == 2)
+        response = self.client.get(f'/static/css/{hashed}',
+                                   HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(
+            gzip.decompress(b''.join(response.streaming_content)), CSS)
@@ -0,0 +1,34 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+
+class SQLitePragmasTest(TestCase):
+    """Класс тестирования настройки соединений SQLite."""
+
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_new_connections_get_pragmas(self):
+        """Новое соединение получает PRAGMA из настроек базы."""
+        connection.close()
+        connection.ensure_connection()
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('cache_size'), -64 * 1024)
+        self.assertEqual(self.pragma('synchronous'), 1)
+
+
+class SQLiteBenchmarkTest(SimpleTestCase):
+    """Класс тестирования нагрузочного сравнения PRAGMA."""
+
+    def test_benchmark_reports_both_configurations(self):
+        """Бенчмарк выводит результаты без PRAGMA и с ними."""
+        out = StringIO()
+        call_command('benchmark_sqlite', seconds=0.2, rows=100,
+                     readers=1, writers=1, stdout=out)
+        self.assertIn('по умолчанию', out.getvalue())
+        self.assertIn('SQLITE_PRAGMAS', out.getvalue())
@@ -0,0 +1,120 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+from posts.thumbnails import cached_thumbnail, generate_thumbnails
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+
+
+def uploaded(name='small.gif'):
+    return SimpleUploadedFile(name=name, content=SMALL_GIF,
+                              content_type='image/gif')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTest(TestCase):
+    """Класс тестирования фонового создания миниатюр."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='thumbnails')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(author=self.user, text='image',
+                                        image=uploaded())
+
+    def test_placeholder_until_thumbnail_is_ready(self):
+        """Пока миниатюры нет, выводится заглушка без обращения к файлу."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.assertIsNone(cached_thumbnail(self.post.image, 'post'))
+        response = self.client.get(url)
+        self.assertContains(response, 'aspect-ratio')
+        self.assertNotContains(response, '<img class="card-img')
+        generate_thumbnails([self.post.pk])
+        thumbnail = cached_thumbnail(self.post.image, 'post')
+        self.assertEqual((thumbnail.width, thumbnail.height), (960, 339))
+        response = self.client.get(url)
+        self.assertContains(response, thumbnail.url)
+
+    def test_feed_renders_images_without_file_access(self):
+        """Лента выводит картинку с размерами, не открывая файлы."""
+        generate_thumbnails([self.post.pk])
+        with mock.patch.object(FileSystemStorage, 'open',
+                               side_effect=AssertionError), \
+                mock.patch.object(FileSystemStorage, 'exists',
+                                  side_effect=AssertionError):
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'width="960" height="339"')
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_picture_lists_variants(self):
+        """<picture> перечисляет ширины и форматы готовых вариантов."""
+        generate_thumbnails([self.post.pk])
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, '.webp 480w')
+        self.assertContains(response, '.jpg 960w')
+        # Исходник 1×1: крупнее базовой миниатюры варианты не создаются.
+        self.assertNotContains(response, '1440w')
+
+    def test_warm_thumbnails_command(self):
+        """Команда создаёт недостающие миниатюры."""
+        out = StringIO()
+        call_command('warm_thumbnails', workers=1, stdout=out)
+        self.assertIn('1', out.getvalue())
+        self.assertIsNotNone(cached_thumbnail(self.post.image, 'post'))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_ASYNC=False)
+class ThumbnailScheduleTest(TransactionTestCase):
+    """Миниатюры создаются после сохранения поста с картинкой."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='uploader')
+        self.client.force_login(self.user)
+
+    def test_post_create_schedules_thumbnails(self):
+        self.client.post(reverse('posts:post_create'),
+                         {'text': 'text', 'image': uploaded()})
+        post = Post.objects.get()
+        self.assertIsNotNone(cached_thumbnail(post.image, 'post'))
+
+    @override_settings(QUERY_BUDGET_MODE='fail')
+    def test_thumbnails_are_outside_query_budget(self):
+        """Миниатюры, нарисованные в запросе, не расходуют его бюджет."""
+        response = self.client.post(reverse('posts:post_create'),
+                                    {'text': 'text', 'image': uploaded()})
+        self.assertEqual(response.status_code, 302)
+        post = Post.objects.get()
+        self.assertIsNotNone(cached_thumbnail(post.image, 'post'))
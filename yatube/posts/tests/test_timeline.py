@@ -0,0 +1,114 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.feeds import HybridFeed
+from posts.models import Follow, Post, TimelineEntry, User
+from posts.utils import FeedPaginator
+
+
+class TimelineTest(TestCase):
+    """Класс тестирования материализованной ленты подписок."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='timeline_author')
+        cls.reader = User.objects.create_user(username='timeline_reader')
+        cls.old_post = Post.objects.create(author=cls.author, text='old')
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка добавляет старые посты автора, отписка убирает."""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=self.old_post).exists())
+        follow.delete()
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader).exists())
+
+    def test_new_post_is_pushed_to_followers(self):
+        """Новый пост попадает в ленты подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='new')
+        entry = TimelineEntry.objects.get(user=self.reader, post=post)
+        self.assertEqual(entry.pub_date, post.pub_date)
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']),
+                         [post, self.old_post])
+
+    def test_rebuild_timelines_command(self):
+        """Команда пересобирает ленты с нуля."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 1)
+
+
+@override_settings(FEED_FANOUT_THRESHOLD=1)
+class HybridFeedTest(TestCase):
+    """Класс тестирования гибридной ленты подписок."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.star = User.objects.create_user(username='star')
+        cls.author = User.objects.create_user(username='hybrid_author')
+        cls.reader = User.objects.create_user(username='hybrid_reader')
+        cls.fan = User.objects.create_user(username='hybrid_fan')
+
+    def setUp(self):
+        cache.clear()
+        Follow.objects.create(user=self.fan, author=self.star)
+        cache.clear()
+        Follow.objects.create(user=self.reader, author=self.star)
+        Follow.objects.create(user=self.reader, author=self.author)
+        cache.clear()
+
+    def test_high_follower_posts_are_not_pushed(self):
+        """Посты популярного автора не раскладываются по лентам."""
+        post = Post.objects.create(author=self.star, text='star')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+
+    def test_feed_merges_pulled_and_pushed_posts(self):
+        """Лента сливает посты из ленты и популярных авторов по дате."""
+        first = Post.objects.create(author=self.star, text='1')
+        second = Post.objects.create(author=self.author, text='2')
+        third = Post.objects.create(author=self.star, text='3')
+        feed = HybridFeed(self.reader)
+        self.assertEqual(feed.count(), 3)
+        self.assertEqual(feed[0:10], [third, second, first])
+        self.assertEqual(feed[1:2], [second])
+
+    @override_settings(FEED_PULL_DEPTH=1)
+    def test_pull_depth_limits_merged_posts(self):
+        """Из популярных авторов подмешивается не больше FEED_PULL_DEPTH."""
+        Post.objects.create(author=self.star, text='1')
+        last = Post.objects.create(author=self.star, text='2')
+        self.assertEqual(HybridFeed(self.reader)[0:10], [last])
+
+    @override_settings(PAGINATOR_EXACT_COUNT_THRESHOLD=2,
+                       PAGINATOR_COUNT_ASYNC=False)
+    def test_paginator_caches_feed_count(self):
+        """Выше порога количество постов ленты берётся из кэша."""
+        for text in ('1', '2', '3'):
+            Post.objects.create(author=self.author, text=text)
+        Post.objects.create(author=self.star, text='star')
+        paginator = FeedPaginator(HybridFeed(self.reader), 2)
+        self.assertEqual(paginator.count, 4)
+        self.assertFalse(paginator.count_is_exact)
+        Post.objects.create(author=self.author, text='new')
+        self.assertEqual(
+            FeedPaginator(HybridFeed(self.reader), 2).count, 4)
+
+    @override_settings(PAGINATION_MODES={'follow_index': 'keyset'})
+    def test_keyset_mode_is_rejected(self):
+        """Режим keyset для ленты подписок — ошибка настройки."""
+        self.client.force_login(self.reader)
+        with self.assertRaisesMessage(ImproperlyConfigured, 'follow_index'):
+            self.client.get(reverse('posts:follow_index'))
@@ -0,0 +1,109 @@
+import shutil
+import struct
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.client import BOUNDARY, encode_multipart
+from django.urls import reverse
+from PIL import Image
+
+from posts.models import Post, User
+from posts.uploads import ImageUploadHandler
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def jpeg_with_exif(size=(50, 20)):
+    exif = Image.Exif()
+    exif[0x010F] = 'Camera maker'
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'JPEG', exif=exif)
+    return SimpleUploadedFile('photo.jpg', buffer.getvalue(), 'image/jpeg')
+
+
+def psd(size=(50, 20)):
+    """Несжатый RGB PSD: Pillow его читает, но сохранять не умеет."""
+    width, height = size
+    header = struct.pack('>4sH6xHIIHH', b'8BPS', 1, 3, height, width, 8, 3)
+    sections = struct.pack('>IIIH', 0, 0, 0, 0)
+    pixels = bytes([255]) * width * height + bytes(2 * width * height)
+    return SimpleUploadedFile('layers.psd', header + sections + pixels,
+                              'image/vnd.adobe.photoshop')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_ASYNC=False)
+class ImageUploadTest(TestCase):
+    """Класс тестирования приёма картинок постов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def upload(self, image):
+        return self.client.post(reverse('posts:post_create'),
+                                {'text': 'photo', 'image': image})
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=100)
+    def test_too_large_file_is_rejected(self):
+        """Файл больше лимита не принимается."""
+        response = self.upload(jpeg_with_exif((200, 200)))
+        self.assertFormError(response, 'form', 'image',
+                             'Файл больше 0 МБ.')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=999)
+    def test_too_many_pixels_are_rejected_by_header(self):
+        """Картинка с лишними пикселями отклоняется по заголовку."""
+        response = self.upload(jpeg_with_exif())
+        self.assertFormError(response, 'form', 'image',
+                             'В картинке больше 0 млн пикселей.')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(IMAGE_MAX_DIMENSION=10)
+    def test_exif_is_stripped_and_original_downsized(self):
+        """EXIF удаляется, крупный оригинал уменьшается."""
+        self.upload(jpeg_with_exif())
+        post = Post.objects.get()
+        self.assertEqual((post.image_width, post.image_height), (10, 4))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (10, 4))
+            self.assertFalse(image.getexif())
+
+    @override_settings(IMAGE_MAX_DIMENSION=10)
+    def test_read_only_format_is_saved_as_jpeg(self):
+        """Картинка в формате без записи в Pillow сохраняется в JPEG."""
+        self.upload(psd())
+        post = Post.objects.get()
+        self.assertEqual(post.image_format, 'JPEG')
+        self.assertTrue(post.image.name.endswith('.jpeg'))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (10, 4))
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=100)
+    def test_rejected_upload_is_not_read_to_the_end(self):
+        """Слишком большой файл обрывает чтение тела запроса."""
+        body = encode_multipart(BOUNDARY, {
+            'image': SimpleUploadedFile('big.jpg', bytes(4 * 1024 * 1024)),
+            'text': 'photo',
+        })
+        stream = BytesIO(body)
+        request = RequestFactory().post(
+            reverse('posts:post_create'), body,
+            content_type=f'multipart/form-data; boundary={BOUNDARY}',
+            **{'wsgi.input': stream})
+        request.upload_handlers = [ImageUploadHandler(request)]
+        self.assertNotIn('image', request.FILES)
+        self.assertIn('image', request.upload_errors)
+        self.assertLess(stream.tell(), len(body) // 4)
@@ -0,0 +1,60 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from posts.models import Post, User
+from posts.utils import FeedPaginator
+
+PER_PAGE = 2
+THRESHOLD = 5
+
+
+class FeedPaginatorTest(TestCase):
+    """Класс тестирования пагинатора лент."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='counter')
+        for i in range(12):
+            Post.objects.create(author=cls.user, text=f'{i} Text')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_exact_count_below_threshold(self):
+        """Ниже порога количество считается точно."""
+        paginator = FeedPaginator(Post.objects.all(), PER_PAGE)
+        self.assertEqual(paginator.count, 12)
+        self.assertTrue(paginator.count_is_exact)
+
+    @override_settings(PAGINATOR_EXACT_COUNT_THRESHOLD=THRESHOLD,
+                       PAGINATOR_COUNT_ASYNC=False)
+    def test_count_above_threshold_comes_from_cache(self):
+        """Выше порога количество берётся из кэша без COUNT(*)."""
+        paginator = FeedPaginator(Post.objects.all(), PER_PAGE)
+        self.assertEqual(paginator.count, 12)
+        self.assertFalse(paginator.count_is_exact)
+        Post.objects.create(author=self.user, text='new')
+        paginator = FeedPaginator(Post.objects.all(), PER_PAGE)
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, 12)
+
+    @override_settings(PAGINATOR_EXACT_COUNT_THRESHOLD=THRESHOLD,
+                       PAGINATOR_COUNT_ASYNC=False)
+    def test_estimated_count_does_not_cut_deep_pages(self):
+        """Оценка количества не обрезает номер страницы."""
+        paginator = FeedPaginator(Post.objects.all(), PER_PAGE)
+        self.assertEqual(len(paginator.get_page(6)), PER_PAGE)
+
+    def test_elided_page_range(self):
+        """Выводится только окно страниц вокруг текущей."""
+        paginator = FeedPaginator(Post.objects.all(), 1)
+        ellipsis = FeedPaginator.ELLIPSIS
+        self.assertEqual(list(paginator.get_elided_page_range(1)),
+                         [1, 2, 3, 4, ellipsis, 12])
+        self.assertEqual(list(paginator.get_elided_page_range(7)),
+                         [1, ellipsis, 4, 5, 6, 7, 8, 9, 10, 11, 12])
+        self.assertEqual(list(paginator.get_elided_page_range(6)),
+                         [1, 2, 3, 4, 5, 6, 7, 8, 9, ellipsis, 12])
+        self.assertEqual(list(paginator.get_elided_page_range(12)),
+                         [1, ellipsis, 9, 10, 11, 12])
@@ -2,11 +2,13 @@ from django import forms
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from posts.forms import PostForm
-from posts.models import Follow, Group, Post, User
+from posts.models import Comment, Follow, Group, Post, User
 
 SECOND_PAGE_PAGINATOR = 3
 
@@ -24,6 +26,7 @@ class CaheTests(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -32,7 +35,7 @@ class CaheTests(TestCase):
         """Тестируем  кэш главной страницы."""
         response = self.authorized_client.get(
             reverse('posts:index')).content
-        self.post_cash.delete()
+        Post.objects.filter(pk=self.post_cash.pk).update(text='Без сигналов')
         response_cache = self.authorized_client.get(
             reverse('posts:index')).content
         self.assertEqual(response, response_cache)
@@ -41,6 +44,35 @@ class CaheTests(TestCase):
             reverse('posts:index')).content
         self.assertNotEqual(response, response_clear)
 
+    def test_cache_invalidated_on_delete(self):
+        """Удаление поста сразу сбрасывает кэш главной страницы."""
+        response = self.authorized_client.get(
+            reverse('posts:index')).content
+        Post.objects.filter(pk=self.post_cash.pk).delete()
+        response_deleted = self.authorized_client.get(
+            reverse('posts:index')).content
+        self.assertNotEqual(response, response_deleted)
+
+    def test_cache_invalidated_on_comment(self):
+        """Новый комментарий сбрасывает кэш страниц с постом."""
+        url = reverse('posts:profile',
+                      kwargs={'username': self.user.username})
+        version = self.guest_client.get(url).context['feed_version']
+        Comment.objects.create(post=self.post_cash, author=self.user,
+                               text='Комментарий')
+        self.assertNotEqual(
+            self.guest_client.get(url).context['feed_version'], version)
+
+    def test_cache_key_depends_on_page(self):
+        """Разные страницы ленты кэшируются отдельно."""
+        for i in range(settings.POSTS_PER_PAGE):
+            Post.objects.create(author=self.user, text=f'{i} Text')
+        first = self.guest_client.get(reverse('posts:index')).content
+        second = self.guest_client.get(
+            reverse('posts:index') + '?page=2').content
+        self.assertNotEqual(first, second)
+        self.assertIn('Тестируем cashe', second.decode())
+
 
 class PagesTests(TestCase):
 
@@ -226,6 +258,90 @@ class PiginatorViewsTest(TestCase):
                                  SECOND_PAGE_PAGINATOR)
 
 
+class KeysetPaginatorTest(TestCase):
+    """Класс тестирования пагинации по курсору."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='cursor')
+        for i in range(13):
+            Post.objects.create(author=cls.user, text=f'{i} Text')
+        cls.url = reverse('posts:profile',
+                          kwargs={'username': cls.user.username})
+
+    def test_cursor_pages_walk_whole_feed(self):
+        """Курсоры after/before проходят ленту без пропусков и повторов."""
+        first = self.client.get(self.url).context['page_obj']
+        self.assertTrue(first.is_cursor)
+        self.assertFalse(first.has_previous())
+        self.assertEqual(len(first), settings.POSTS_PER_PAGE)
+        second = self.client.get(
+            self.url, {'after': first.next_cursor}).context['page_obj']
+        self.assertEqual(len(second), SECOND_PAGE_PAGINATOR)
+        self.assertFalse(second.has_next())
+        ids = [post.id for post in list(first) + list(second)]
+        self.assertEqual(
+            ids, list(Post.objects.order_by('-pub_date', '-pk')
+                      .values_list('id', flat=True)))
+        back = self.client.get(
+            self.url, {'before': second.previous_cursor}).context['page_obj']
+        self.assertEqual(list(back), list(first))
+
+    def test_deep_cursor_page_query_count(self):
+        """Страница по курсору стоит столько же запросов, сколько первая."""
+        with CaptureQueriesContext(connection) as first_queries:
+            first = self.client.get(self.url).context['page_obj']
+        with self.assertNumQueries(len(first_queries)):
+            self.client.get(self.url, {'after': first.next_cursor})
+
+    def test_bad_cursor_returns_first_page(self):
+        """Испорченный токен курсора отдаёт первую страницу."""
+        response = self.client.get(self.url, {'after': 'broken'})
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+
+class CommentsPaginationTest(TestCase):
+    """Класс тестирования постраничного вывода комментариев."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='comments_author')
+        cls.post = Post.objects.create(author=cls.author, text='text')
+        for i in range(settings.COMMENTS_PER_PAGE + 5):
+            commentator = User.objects.create_user(username=f'commentator{i}')
+            Comment.objects.create(post=cls.post, author=commentator,
+                                   text=f'comment {i}')
+        cls.url = reverse('posts:post_detail', kwargs={'post_id': cls.post.id})
+
+    def test_post_detail_queries_do_not_grow_with_comments(self):
+        """Число запросов страницы поста не зависит от комментариев."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.context['comments']),
+                         settings.COMMENTS_PER_PAGE)
+        Comment.objects.create(post=self.post, author=self.author,
+                               text='one more')
+        with self.assertNumQueries(len(queries)):
+            self.client.get(self.url)
+
+    def test_load_more_fragment_and_json(self):
+        """Эндпоинт комментариев отдаёт следующую порцию."""
+        first = self.client.get(self.url).context['comments']
+        comments_url = reverse('posts:post_comments',
+                               kwargs={'post_id': self.post.id})
+        response = self.client.get(comments_url,
+                                   {'after': first.next_cursor})
+        self.assertTemplateUsed(response, 'includes/comments.html')
+        self.assertEqual(len(response.context['comments']), 5)
+        data = self.client.get(comments_url, {
+            'after': first.next_cursor, 'format': 'json'}).json()
+        self.assertEqual(len(data['comments']), 5)
+        self.assertIsNone(data['next'])
+        self.assertEqual(data['comments'][-1]['text'], 'comment 0')
+
+
 class FollowerFormTest(TestCase):
     """Класс тестирования подисок."""
 
@@ -0,0 +1,211 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from sorl.thumbnail import base as sorl_base
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from core.middleware import unmetered
+
+from .caching import bump_generations, post_scopes
+from .images import MIME_TYPES, saveable_formats
+from .models import MediaFile, Post
+
+logger = logging.getLogger(__name__)
+
+# sorl-thumbnail берёт расширение файла миниатюры из этой таблицы,
+# AVIF в ней нет.
+sorl_base.EXTENSIONS.setdefault('AVIF', 'avif')
+
+_executor = None
+_slots = None
+_lock = threading.Lock()
+
+
+def _options(name):
+    geometry, options = settings.THUMBNAIL_GEOMETRIES[name]
+    return geometry, dict(options)
+
+
+def variant_widths(name, source_width=None):
+    """
+    Ширины вариантов для srcset. Шире базовой миниатюры — только
+    если исходная картинка это позволяет.
+    """
+    geometry, _ = _options(name)
+    base_width = int(geometry.split('x')[0])
+    widths = settings.THUMBNAIL_SRCSET.get(name, {}).get('widths', ())
+    return sorted({base_width} | {
+        width for width in widths
+        if width <= base_width or width <= (source_width or 0)})
+
+
+def variants(name, source_width=None):
+    """
+    Размеры и параметры всех миниатюр name: формат по умолчанию и
+    современные форматы для каждой ширины из variant_widths.
+    """
+    geometry, options = _options(name)
+    base_width, base_height = map(int, geometry.split('x'))
+    formats = [None] + saveable_formats(settings.THUMBNAIL_MODERN_FORMATS)
+    for width in variant_widths(name, source_width):
+        height = round(base_height * width / base_width)
+        for image_format in formats:
+            variant = dict(options)
+            if image_format:
+                variant['format'] = image_format
+            yield image_format, width, f'{width}x{height}', variant
+
+
+def cached_thumbnail(image, name):
+    """
+    Готовая миниатюра размера name из хранилища sorl-thumbnail или None.
+    Ничего не рисует и не открывает исходный файл.
+    """
+    if not image:
+        return None
+    return _cached(image, *_options(name))
+
+
+def _cached(image, geometry, options):
+    backend = default.backend
+    source = ImageFile(image)
+    # Те же умолчания, что в ThumbnailBackend.get_thumbnail: от них
+    # зависит имя файла миниатюры.
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return default.kvstore.get(ImageFile(name, default.storage))
+
+
+def picture(image, name, source_width=None):
+    """
+    Готовые варианты миниатюры для <picture>: базовая картинка, srcset
+    в формате по умолчанию и источники современных форматов. Пока нет
+    базовой миниатюры, возвращает None. Файлы не открываются.
+    """
+    thumbnail = cached_thumbnail(image, name)
+    if thumbnail is None:
+        return None
+    srcsets = {}
+    for image_format, width, geometry, options in variants(
+            name, source_width):
+        variant = _cached(image, geometry, options)
+        if variant is not None:
+            srcsets.setdefault(image_format, []).append(
+                f'{variant.url} {width}w')
+    return {
+        'image': thumbnail,
+        'srcset': ', '.join(srcsets.pop(None, ())),
+        'sources': [
+            (MIME_TYPES[image_format], ', '.join(srcsets[image_format]))
+            for image_format in settings.THUMBNAIL_MODERN_FORMATS
+            if image_format in srcsets
+        ],
+        'sizes': settings.THUMBNAIL_SRCSET.get(name, {}).get('sizes', ''),
+    }
+
+
+def generate_thumbnails(post_ids):
+    """
+    Рисует миниатюры всех размеров для постов с картинками.
+    Возвращает ленты, страницы которых нужно перерисовать.
+    """
+    scopes = set()
+    posts = Post.objects.filter(pk__in=post_ids).exclude(image='').only(
+        'image', 'image_width', 'group_id', 'author_id')
+    for post in posts:
+        # Среди вариантов есть и базовая миниатюра каждого размера.
+        for name in settings.THUMBNAIL_GEOMETRIES:
+            for _, _, geometry, options in variants(name, post.image_width):
+                get_thumbnail(post.image, geometry, **options)
+        scopes.update(post_scopes(post.group_id, post.author_id))
+    # Заглушка в закэшированных фрагментах постов сменится картинкой.
+    Post.objects.filter(pk__in=post_ids).update(updated_at=timezone.now())
+    return scopes
+
+
+def delete_image(name):
+    """Удаляет файл картинки, его миниатюры и записи sorl о них."""
+    storage = Post._meta.get_field('image').storage
+    default.backend.delete(ImageFile(name, storage))
+
+
+def delete_unreferenced_image(name):
+    """
+    Удаляет картинку, если на неё не осталось ссылок. Файлы моложе
+    MEDIA_MIN_AGE остаются сборщику collect_media_garbage: их могла
+    только что переиспользовать загрузка того же содержимого.
+    """
+    deleted, _ = MediaFile.objects.filter(name=name, references=0).delete()
+    if not deleted:
+        return False
+    path = Post._meta.get_field('image').storage.path(name)
+    try:
+        if os.path.getmtime(path) > time.time() - settings.MEDIA_MIN_AGE:
+            return False
+    except FileNotFoundError:
+        return False
+    delete_image(name)
+    return True
+
+
+def release_image(name):
+    """Удаляет картинку без ссылок после фиксации транзакции."""
+    if name:
+        transaction.on_commit(lambda: delete_unreferenced_image(name))
+
+
+def _get_executor():
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                settings.THUMBNAIL_WORKERS, thread_name_prefix='thumbnails')
+            _slots = threading.BoundedSemaphore(
+                settings.THUMBNAIL_QUEUE_SIZE)
+    return _executor
+
+
+def _run(post_id):
+    try:
+        bump_generations(generate_thumbnails([post_id]))
+    except Exception:
+        logger.exception('Не удалось создать миниатюры поста %s', post_id)
+    finally:
+        _slots.release()
+        connection.close()
+
+
+def _submit(post_id):
+    if not settings.THUMBNAIL_ASYNC:
+        # Без фона миниатюры рисуются в запросе, сохранившем пост, но
+        # в его бюджет запросов не входят.
+        with unmetered():
+            bump_generations(generate_thumbnails([post_id]))
+        return
+    executor = _get_executor()
+    if not _slots.acquire(blocking=False):
+        logger.warning('Очередь миниатюр заполнена, пост %s пропущен',
+                       post_id)
+        return
+    executor.submit(_run, post_id)
+
+
+def schedule_thumbnails(post_id):
+    """Создаёт миниатюры поста в фоне после фиксации транзакции."""
+    transaction.on_commit(lambda: _submit(post_id))
@@ -0,0 +1,87 @@
+from functools import wraps
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadhandler import (SkipFile, StopUpload,
+                                             TemporaryFileUploadHandler)
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image
+
+UPLOAD_ERRORS = {
+    'size': 'Файл больше {limit} МБ.',
+    'pixels': 'В картинке больше {limit} млн пикселей.',
+    'header': 'Загрузите правильное изображение.',
+}
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """
+    Пишет загружаемые файлы на диск кусками и обрывает приём, как только
+    превышен IMAGE_UPLOAD_MAX_BYTES или по заголовку картинки видно, что
+    в ней больше IMAGE_UPLOAD_MAX_PIXELS пикселей. Остаток тела запроса
+    при этом не читается: поля формы после файла теряются, а браузер
+    может увидеть сброс соединения. Файл, не похожий на картинку,
+    только пропускается. Причина отказа остаётся в request.upload_errors.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.header = BytesIO()
+
+    def reject(self, reason, limit=None):
+        self.file.close()
+        errors = getattr(self.request, 'upload_errors', {})
+        errors[self.field_name] = UPLOAD_ERRORS[reason].format(limit=limit)
+        self.request.upload_errors = errors
+        if reason == 'header':
+            raise SkipFile()
+        # SkipFile дочитал бы файл до конца, сколько бы гигабайт в нём ни
+        # было; StopUpload с connection_reset бросает тело запроса.
+        raise StopUpload(connection_reset=True)
+
+    def check_header(self, raw_data):
+        self.header.write(raw_data)
+        self.header.seek(0)
+        try:
+            # Image.open читает только заголовок и не декодирует пиксели.
+            with Image.open(self.header) as image:
+                width, height = image.size
+        except Image.DecompressionBombError:
+            self.reject('pixels',
+                        settings.IMAGE_UPLOAD_MAX_PIXELS // 1000 // 1000)
+        except (OSError, SyntaxError):
+            # Заголовок ещё не пришёл целиком — ждём следующий кусок.
+            self.header.seek(0, 2)
+            if self.header.tell() > settings.IMAGE_UPLOAD_HEADER_BYTES:
+                self.reject('header')
+            return
+        self.header = None
+        if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+            self.reject('pixels',
+                        settings.IMAGE_UPLOAD_MAX_PIXELS // 1000 // 1000)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.IMAGE_UPLOAD_MAX_BYTES:
+            self.reject('size',
+                        settings.IMAGE_UPLOAD_MAX_BYTES // 1024 // 1024)
+        if self.header is not None:
+            self.check_header(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+
+def image_uploads(view):
+    """
+    Принимает файлы запроса через ImageUploadHandler. Обработчики можно
+    заменить только до чтения request.POST, поэтому CSRF проверяется
+    здесь, а не в middleware.
+    """
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [ImageUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+    return wrapper
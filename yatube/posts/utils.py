@@ -1,11 +1,269 @@
+import binascii
+import hashlib
+import threading
+import time
+
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ImproperlyConfigured
+from django.core.paginator import (EmptyPage, Page, PageNotAnInteger,
+                                   Paginator)
+from django.db import connection
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_str
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+PAGINATION_OFFSET = 'offset'
+PAGINATION_KEYSET = 'keyset'
+
+
+def encode_cursor(obj, field='pub_date'):
+    """Кодирует позицию записи (дата, id) в непрозрачный токен."""
+    value = f'{getattr(obj, field).isoformat()}|{obj.pk}'
+    return urlsafe_base64_encode(force_bytes(value))
+
+
+def decode_cursor(token):
+    """Разбирает токен курсора, при ошибке возвращает None."""
+    try:
+        value, pk = force_str(urlsafe_base64_decode(token)).split('|')
+        value, pk = parse_datetime(value), int(pk)
+    except (binascii.Error, TypeError, ValueError):
+        return None
+    if value is None:
+        return None
+    return value, pk
+
+
+class CursorPage(Page):
+    """Страница, полученная поиском по ключу (дата, id)."""
+
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self.field = paginator.field
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<Cursor page of {len(self.object_list)} objects>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next:
+            return encode_cursor(self.object_list[-1], self.field)
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous:
+            return encode_cursor(self.object_list[0], self.field)
+        return None
+
+
+class KeysetPaginator(Paginator):
+    """
+    Пагинатор без OFFSET: следующая страница ищется по индексу
+    от последней показанной записи, поэтому глубокие страницы
+    стоят столько же, сколько первая.
+    """
+
+    def __init__(self, object_list, per_page, field='pub_date', **kwargs):
+        self.field = field
+        super().__init__(
+            object_list.order_by(f'-{field}', '-pk'), per_page, **kwargs)
+
+    def get_cursor_page(self, after=None, before=None):
+        queryset = self.object_list
+        field = self.field
+        if before is not None:
+            value, pk = before
+            queryset = queryset.filter(
+                Q(**{f'{field}__gt': value})
+                | Q(**{field: value, 'pk__gt': pk})
+            ).order_by(field, 'pk')
+        elif after is not None:
+            value, pk = after
+            queryset = queryset.filter(
+                Q(**{f'{field}__lt': value})
+                | Q(**{field: value, 'pk__lt': pk}))
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if before is not None:
+            if not has_more:
+                # Дошли до начала ленты — показываем полную первую страницу.
+                return self.get_cursor_page()
+            rows.reverse()
+            return CursorPage(rows, self, has_next=True, has_previous=True)
+        return CursorPage(rows, self, has_next=has_more,
+                          has_previous=after is not None)
+
+
+def _store_count(key, count):
+    cache.set(key, (count, time.monotonic() + settings.PAGINATOR_COUNT_TTL),
+              settings.PAGINATOR_COUNT_TTL * 10)
+
+
+def _refresh_count(queryset, key):
+    try:
+        _store_count(key, queryset.count())
+    finally:
+        cache.delete(f'{key}:lock')
+        connection.close()
+
+
+class FeedPaginator(Paginator):
+    """
+    Пагинатор без COUNT(*) по всей таблице: до порога считает точно,
+    выше порога отдаёт закэшированное значение и обновляет его в фоне.
+    Кроме QuerySet принимает ленты с методом count(limit) и свойством
+    count_key, как HybridFeed.
+    """
+
+    ELLIPSIS = '…'
+    on_each_side = 3
+    on_ends = 1
+
+    @cached_property
+    def _count_info(self):
+        threshold = settings.PAGINATOR_EXACT_COUNT_THRESHOLD
+        if isinstance(self.object_list, QuerySet):
+            bounded = self.object_list[:threshold + 1].count()
+        elif hasattr(self.object_list, 'count_key'):
+            bounded = self.object_list.count(threshold + 1)
+        else:
+            return Paginator.count.func(self), True
+        if bounded <= threshold:
+            return bounded, True
+        try:
+            key = self._count_key()
+        except EmptyResultSet:
+            return 0, True
+        cached = cache.get(key)
+        if cached is None or cached[1] < time.monotonic():
+            self._schedule_refresh(key)
+            cached = cache.get(key, cached)
+        if cached is None:
+            return bounded, False
+        return max(cached[0], bounded), False
+
+    def _count_key(self):
+        if not isinstance(self.object_list, QuerySet):
+            return self.object_list.count_key
+        return 'paginator_count:' + hashlib.md5(
+            force_bytes(str(self.object_list.query))).hexdigest()
+
+    @property
+    def count(self):
+        return self._count_info[0]
+
+    @property
+    def count_is_exact(self):
+        return self._count_info[1]
+
+    def _schedule_refresh(self, key):
+        if not cache.add(f'{key}:lock', True,
+                         settings.PAGINATOR_COUNT_TTL):
+            return
+        if settings.PAGINATOR_COUNT_ASYNC:
+            object_list = self.object_list
+            if isinstance(object_list, QuerySet):
+                object_list = object_list.all()
+            threading.Thread(target=_refresh_count,
+                             args=(object_list, key),
+                             daemon=True).start()
+        else:
+            _store_count(key, self.object_list.count())
+            cache.delete(f'{key}:lock')
+
+    def validate_number(self, number):
+        if self.count_is_exact:
+            return super().validate_number(number)
+        # Пока число страниц оценочное, не обрезаем номер по последней.
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        if self.count_is_exact:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom:bottom + self.per_page], number, self)
+
+    def get_elided_page_range(self, number=1):
+        """Номера страниц вокруг текущей с многоточиями по краям."""
+        num_pages = self.num_pages
+        if num_pages <= (self.on_each_side + self.on_ends) * 2:
+            yield from self.page_range
+            return
+        if number > 1 + self.on_each_side + self.on_ends + 1:
+            yield from range(1, 1 + self.on_ends)
+            yield self.ELLIPSIS
+            yield from range(number - self.on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < num_pages - self.on_each_side - self.on_ends - 1:
+            yield from range(number + 1, number + self.on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(num_pages - self.on_ends + 1, num_pages + 1)
+        else:
+            yield from range(number + 1, num_pages + 1)
+
+
+def get_pagination_mode(request):
+    """Режим пагинации для текущего view из settings.PAGINATION_MODES."""
+    resolver_match = getattr(request, 'resolver_match', None)
+    url_name = resolver_match.url_name if resolver_match else None
+    return settings.PAGINATION_MODES.get(url_name, PAGINATION_OFFSET)
 
 
 def get_page_pages(queryset, request):
-    paginator = Paginator(queryset, settings.POSTS_PER_PAGE)
     page_number = request.GET.get('page')
+    keyset = get_pagination_mode(request) == PAGINATION_KEYSET
+    if keyset and not isinstance(queryset, QuerySet):
+        raise ImproperlyConfigured(
+            f'PAGINATION_MODES: лента {request.resolver_match.url_name} '
+            f'не поддерживает режим {PAGINATION_KEYSET!r}, только '
+            f'{PAGINATION_OFFSET!r}.')
+    # Старые ссылки вида ?page=N продолжают работать через OFFSET.
+    if page_number is None and keyset:
+        paginator = KeysetPaginator(queryset, settings.POSTS_PER_PAGE)
+        page_obj = paginator.get_cursor_page(
+            after=decode_cursor(request.GET.get('after', '')),
+            before=decode_cursor(request.GET.get('before', '')),
+        )
+        return {
+            'page_obj': page_obj,
+        }
+    paginator = FeedPaginator(queryset, settings.POSTS_PER_PAGE)
     page_obj = paginator.get_page(page_number)
     return{
         'page_obj': page_obj,
+        'page_range': list(
+            paginator.get_elided_page_range(page_obj.number)),
     }
+
+
+def get_comments_page(post, request):
+    """Порция комментариев к посту после курсора ?after=."""
+    paginator = KeysetPaginator(
+        post.comments.select_related('author'),
+        settings.COMMENTS_PER_PAGE, field='created')
+    return paginator.get_cursor_page(
+        after=decode_cursor(request.GET.get('after', '')))
@@ -1,18 +1,49 @@
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.http import urlencode
+from django.views.decorators.http import condition
 
+from core.middleware import query_budget
+
+from .caching import (feed_cache_context, group_etag, index_etag,
+                      post_etag, profile_etag)
+from .feeds import HybridFeed
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post, User
-from .utils import get_page_pages
+from .search import search_posts
+from .thumbnails import schedule_thumbnails
+from .uploads import image_uploads
+from .utils import get_comments_page, get_page_pages
 
 
+@query_budget(5)
+@condition(etag_func=index_etag)
 def index(request):
     """Выводит шаблоны главной страницы."""
     context = get_page_pages(
         Post.objects.select_related('author', 'group'), request)
+    context.update(feed_cache_context('index'))
     return render(request, 'posts/index.html', context)
 
 
+@query_budget(5)
+def search(request):
+    """Выводит посты, найденные по запросу, по убыванию релевантности."""
+    query = request.GET.get('q', '').strip()
+    context = {
+        'query': query,
+        'page_prefix': urlencode({'q': query}) + '&',
+    }
+    context.update(get_page_pages(
+        search_posts(Post.objects.select_related('author', 'group'), query),
+        request))
+    return render(request, 'posts/search.html', context)
+
+
+@query_budget(7)
+@condition(etag_func=group_etag)
 def group_posts(request, slug):
     """Выводит шаблон с группами постов."""
     group = get_object_or_404(Group, slug=slug)
@@ -21,12 +52,16 @@ def group_posts(request, slug):
     }
     context.update(get_page_pages(
         group.posts.select_related('author', 'group'), request))
+    context.update(feed_cache_context(f'group:{group.pk}'))
     return render(request, 'posts/group_list.html', context)
 
 
+@query_budget(7)
+@condition(etag_func=profile_etag)
 def profile(request, username):
     """Выводит шаблон профайла пользователя."""
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
     following = request.user.is_authenticated and Follow.objects.filter(
         user=request.user,
         author=author).exists()
@@ -35,32 +70,66 @@ def profile(request, username):
         'following': following,
     }
     context.update(get_page_pages(
-        author.posts.all(), request))
+        author.posts.select_related('group'), request))
+    context.update(feed_cache_context(f'author:{author.pk}'))
     return render(request, 'posts/profile.html', context)
 
 
+@query_budget(7)
+@condition(etag_func=post_etag)
 def post_detail(request, post_id):
     """Выводит информацию о посте."""
     form = CommentForm()
-    post = get_object_or_404(Post.objects.select_related("author"), id=post_id)
-    comment = post.comments.all().select_related("author")
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id)
     context = {
         'post': post,
         'form': form,
-        'comment': comment,
+        'comments': get_comments_page(post, request),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@query_budget(3)
+def post_comments(request, post_id):
+    """Следующая порция комментариев: HTML-фрагмент или JSON."""
+    post = get_object_or_404(Post.objects.only('pk'), id=post_id)
+    comments = get_comments_page(post, request)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created.isoformat(),
+                }
+                for comment in comments
+            ],
+            'next': comments.next_cursor,
+        })
+    context = {
+        'post': post,
+        'comments': comments,
+    }
+    return render(request, 'includes/comments.html', context)
+
+
+@query_budget(12)
+@image_uploads
 @login_required
+@transaction.atomic
 def post_create(request):
     """Создания новго поста."""
     form = PostForm(request.POST or None,
-                    files=request.FILES or None)
+                    files=request.FILES or None,
+                    upload_errors=getattr(request, 'upload_errors', None))
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         form.save()
+        if post.image:
+            schedule_thumbnails(post.pk)
         return redirect('posts:profile', request.user)
     context = {
         'form': form,
@@ -68,16 +137,22 @@ def post_create(request):
     return render(request, 'posts/post_create.html', context)
 
 
+@query_budget(12)
+@image_uploads
 @login_required
+@transaction.atomic
 def post_edit(request, post_id):
     """Редактирование поста."""
     post = get_object_or_404(Post, id=post_id)
     if post.author != request.user:
         return redirect('posts:post_detail', post.pk)
     form = PostForm(request.POST or None,
-                    files=request.FILES or None, instance=post)
+                    files=request.FILES or None, instance=post,
+                    upload_errors=getattr(request, 'upload_errors', None))
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data and post.image:
+            schedule_thumbnails(post.pk)
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'form': form,
@@ -87,7 +162,9 @@ def post_edit(request, post_id):
     return render(request, 'posts/post_create.html', context)
 
 
+@query_budget(10)
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     """Получение поста."""
     post = get_object_or_404(Post, id=post_id)
@@ -105,11 +182,11 @@ def add_comment(request, post_id):
     return render(request, 'posts:post_detail', context)
 
 
+@query_budget(8)
 @login_required
 def follow_index(request):
     """Информация о текущем пользователе доступа."""
-    post = Post.objects.filter(
-        author__following__user=request.user)
+    post = HybridFeed(request.user)
     context = {
         'post': post,
     }
@@ -117,7 +194,9 @@ def follow_index(request):
     return render(request, 'posts/follow.html', context)
 
 
+@query_budget(15)
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     """Подписаться на автора."""
     author = get_object_or_404(User, username=username)
@@ -129,7 +208,9 @@ def profile_follow(request, username):
     return redirect("posts:profile", author)
 
 
+@query_budget(12)
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     """Дизлайк,отписка."""
     Follow.objects.filter(
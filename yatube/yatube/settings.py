@@ -62,7 +62,9 @@ INSTALLED_APPS = [
 # anfisa/settings.py
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.RequestMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -71,12 +73,109 @@ MIDDLEWARE = [
 ]
 
 POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+
+# Режим пагинации лент по имени view: 'offset' (по умолчанию) или 'keyset'.
+# Лента подписок follow_index собирается из двух источников и листается
+# только по номерам страниц.
+PAGINATION_MODES = {
+    'index': 'keyset',
+    'profile': 'keyset',
+}
+
+# До этого числа записей пагинатор считает COUNT(*) точно, дальше
+# использует закэшированную оценку, которая обновляется в фоне.
+PAGINATOR_EXACT_COUNT_THRESHOLD = 1000
+PAGINATOR_COUNT_TTL = 300
+PAGINATOR_COUNT_ASYNC = True
+
+# Размер пачки при раскладке постов по лентам подписчиков.
+TIMELINE_BATCH_SIZE = 1000
+
+# Посты авторов, у которых подписчиков больше порога, не раскладываются
+# по лентам, а подмешиваются при чтении (не глубже FEED_PULL_DEPTH постов).
+FEED_FANOUT_THRESHOLD = 10000
+FEED_PULL_DEPTH = 500
+FEED_HIGH_FOLLOWER_TTL = 60
+
+# Время жизни закэшированных страниц лент. Кэш сбрасывается сигналами
+# при изменении постов и комментариев, поэтому TTL может быть большим.
+FEED_CACHE_TTL = 60 * 60
+
+# Время жизни HTML-фрагментов отдельных постов внутри страниц лент.
+# Ключ фрагмента меняется при правке поста, TTL ограничивает только
+# устаревание имени автора и названия группы.
+POST_FRAGMENT_TTL = 24 * 60 * 60
+
+# Размеры миниатюр картинок постов. Миниатюры всех размеров создаются
+# в фоне после сохранения картинки; пока их нет, шаблоны выводят заглушку.
+THUMBNAIL_GEOMETRIES = {
+    'post': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+# При DEBUG миниатюры создаются в запросе, сохраняющем пост: фоновые
+# потоки не переживают перезапуск runserver и мешают тестам.
+THUMBNAIL_ASYNC = not DEBUG
+THUMBNAIL_WORKERS = 2
+# Сколько картинок может ждать обработки. Не поместившиеся в очередь
+# дорисует команда warm_thumbnails.
+THUMBNAIL_QUEUE_SIZE = 100
+# Адаптивные варианты миниатюр для srcset: те же пропорции другой
+# ширины и современные форматы. Ширины больше базовой создаются, только
+# если исходная картинка шире; форматы, которые не умеет сохранять
+# установленный Pillow, пропускаются.
+THUMBNAIL_SRCSET = {
+    'post': {
+        'widths': (480, 960, 1440),
+        'sizes': '(max-width: 992px) 100vw, 960px',
+    },
+}
+THUMBNAIL_MODERN_FORMATS = ('AVIF', 'WEBP')
+
+# Ограничения загрузки картинок постов. Файл пишется на диск кусками;
+# приём обрывается, как только превышен объём или по заголовку видно,
+# что пикселей слишком много. Оригиналы крупнее IMAGE_MAX_DIMENSION по
+# любой стороне уменьшаются, EXIF удаляется.
+IMAGE_UPLOAD_MAX_BYTES = 10 * 1024 * 1024
+IMAGE_UPLOAD_MAX_PIXELS = 40 * 1000 * 1000
+IMAGE_UPLOAD_HEADER_BYTES = 256 * 1024
+IMAGE_MAX_DIMENSION = 4096
+# Файлы картинок моложе стольких секунд не удаляются, даже если на них
+# не ссылается ни один пост: загрузка с тем же содержимым может как раз
+# переиспользовать файл и ещё не успеть сохранить пост.
+MEDIA_MIN_AGE = 60 * 60
+
+# Время жизни закэшированных дат для date_hierarchy в админке. Кэш
+# сбрасывается вместе с поколением главной ленты.
+ADMIN_DATES_CACHE_TTL = 60 * 60
 
 ROOT_URLCONF = 'yatube.urls'
 
+# Двухуровневый кэш: LRU в памяти каждого процесса поверх общего
+# хранилища. Без DEBUG общее хранилище — файл SQLite, который видят все
+# процессы; при DEBUG (и в тестах) — память процесса. Метрики попаданий
+# по группам ключей выводит команда cache_stats.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': 'default',
+        'OPTIONS': {
+            'SHARED': {
+                'BACKEND': (
+                    'django.core.cache.backends.locmem.LocMemCache'
+                    if DEBUG else 'core.cache.SQLiteCache'),
+                'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+                'OPTIONS': {'MAX_ENTRIES': 100000},
+            },
+            'LOCAL_MAX_ENTRIES': 1000,
+            'LOCAL_TIMEOUT': 5,
+            # Промах по этим ключам пересчитывает один процесс.
+            'HOT_PREFIXES': ('template.cache.',),
+            # Эти ключи меняются через incr() и add() и читаются сразу из
+            # общего хранилища, иначе другие процессы видели бы старое
+            # поколение ленты ещё LOCAL_TIMEOUT секунд.
+            'SHARED_ONLY_PREFIXES': (
+                'feed_generation:', 'feed_bumped:', 'replica_synced:'),
+        },
     }
 }
 
@@ -104,12 +203,54 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# PRAGMAS выполняются на каждом новом соединении (core.db). WAL
+# позволяет читать во время записи, busy_timeout ждёт освободившейся
+# блокировки вместо ошибки «database is locked», отрицательный
+# cache_size задаётся в КиБ. Соединения живут CONN_MAX_AGE секунд,
+# чтобы не открывать файл и не повторять PRAGMA на каждый запрос.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -64 * 1024,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 0 if DEBUG else 60,
+        'PRAGMAS': SQLITE_PRAGMAS,
     }
 }
+# Как часто выполнять PRAGMA optimize и контрольную точку WAL.
+SQLITE_MAINTENANCE_INTERVAL = 60 * 60
+
+# Реплики для чтения лент: псевдонимы из DATABASES. Копии SQLite
+# обновляет команда sync_replicas, например:
+# DATABASES['replica'] = {
+#     'ENGINE': 'django.db.backends.sqlite3',
+#     'NAME': os.path.join(BASE_DIR, 'replica.sqlite3'),
+#     'PRAGMAS': SQLITE_PRAGMAS,
+#     'TEST': {'MIRROR': 'default'},
+# }
+# DATABASE_REPLICAS = ['replica']
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+DATABASE_REPLICAS = []
+REPLICA_VIEWS = (
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:follow_index',
+)
+# Насколько реплики могут отставать: столько секунд после своей записи
+# пользователь читает ленты из default, а реплика, синхронизированная
+# раньше, не используется. sync_replicas запускается чаще.
+REPLICA_LAG_TOLERANCE = 5
+# Приложения, модели которых читаются из реплик.
+REPLICA_APPS = ('posts',)
+REPLICA_PIN_COOKIE = 'pin_primary'
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -146,30 +287,50 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 
 STATIC_URL = '/static/'
-
-if DEBUG:
-    import logging
-
-    logging.basicConfig()
-    LOGGING = {
-        'version': 1,
-        'disable_existing_loggers': False,
-        'formatters': {
-            'verbose': {
-                'format': '{pathname}:{lineno} {levelname} {asctime} {message}',
-                'style': '{',
-            },
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+# Без DEBUG collectstatic кладёт файлы под именами с хэшем содержимого
+# и сжатыми копиями .gz/.br рядом; шаблоны ссылаются на хэшированные
+# имена, которые клиент может кэшировать навсегда.
+if not DEBUG:
+    STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+# Файлы меньше этого размера не сжимаются.
+STATIC_COMPRESS_MIN_SIZE = 256
+
+# Кэширование статики и медиа клиентом. Файлы с хэшем содержимого в
+# имени кэшируются на год как неизменяемые, остальные — на
+# FILES_MAX_AGE, после чего проверяются по ETag.
+FILES_MAX_AGE = 24 * 60 * 60
+IMMUTABLE_FILES_MAX_AGE = 365 * 24 * 60 * 60
+# Передать отдачу файлов веб-серверу: 'X-Sendfile' (Apache, lighttpd)
+# или 'X-Accel-Redirect' (nginx; internal-локация SENDFILE_INTERNAL_URL
+# повторяет адреса /static/ и /media/). None — файлы отдаёт Django.
+SENDFILE_HEADER = None
+SENDFILE_INTERNAL_URL = '/internal/'
+
+# Что делать, если view превысил бюджет SQL-запросов из @query_budget:
+# 'warn' — записать предупреждение, 'fail' — выбросить исключение,
+# 'off' — ничего.
+QUERY_BUDGET_MODE = 'warn'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'verbose': {
+            'format': '{levelname} {asctime} {name} {message}',
+            'style': '{',
         },
-        'handlers': {
-            'console': {
-                'class': 'logging.StreamHandler',
-                'formatter': 'verbose'
-            },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'verbose'
         },
-        'loggers': {
-            'django.db.backends': {
-                'handlers': ['console'],
-                'level': 'DEBUG',
-            },
+    },
+    'loggers': {
+        'yatube.requests': {
+            'handlers': ['console'],
+            'level': 'INFO',
         },
-    }
+    },
+}